@@ -0,0 +1,286 @@
+import base64
+import hashlib
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from appwrite.client import Client
+from appwrite.exception import AppwriteException
+from appwrite.services.databases import Databases
+from appwrite.query import Query
+from cache import LRUCache
+from history import History
+from hll import HyperLogLog
+from storage import StorageBackend
+
+
+# Responses are read as dicts, which the SDK returns up to 15.x (16.0
+# switched to pydantic models); requirements pin appwrite<16
+class AppwriteBackend(StorageBackend):
+    def __init__(self):
+        self.client = Client()
+        self.client.set_endpoint(os.getenv('APPWRITE_ENDPOINT'))
+        self.client.set_project(os.getenv('APPWRITE_PROJECT_ID'))
+        self.client.set_key(os.getenv('APPWRITE_API_KEY'))
+
+        self.database = Databases(self.client)
+        self.database_id = os.getenv('DATABASE_ID')
+        self.collection_id = os.getenv('COLLECTION_ID')
+        self.ip_collection_id = os.getenv('IP_COLLECTION_ID')
+        self.sketch_collection_id = os.getenv('SKETCH_COLLECTION_ID')
+        self.history_collection_id = os.getenv('HISTORY_COLLECTION_ID')
+        # Counter document ids by (repository, shard), for as many
+        # repositories as the count cache holds. Pool threads share it.
+        self._document_ids = LRUCache(int(os.getenv('COUNT_CACHE_MAX_ENTRIES', '10000')))
+        self._document_ids_lock = threading.Lock()
+
+    def fetch_count(self, repo: str) -> int:
+        # A sharded repository has one document per shard; the count is
+        # their sum
+        result = self.database.list_documents(
+            database_id=self.database_id,
+            collection_id=self.collection_id,
+            queries=[Query.equal('repository', repo), Query.limit(100)]
+        )
+        return sum(doc['count'] for doc in result['documents'])
+
+    # Appwrite accepts at most 100 values per query and 100 documents per page
+    QUERY_VALUES = 100
+    PAGE_SIZE = 100
+
+    def fetch_counts(self, repos: List[str]) -> Dict[str, int]:
+        counts = dict.fromkeys(repos, 0)
+        unique = list(counts)
+        for start in range(0, len(unique), self.QUERY_VALUES):
+            chunk = unique[start:start + self.QUERY_VALUES]
+            cursor = None
+            while True:
+                queries = [
+                    Query.equal('repository', chunk),
+                    Query.select(['$id', 'repository', 'count']),
+                    Query.limit(self.PAGE_SIZE)
+                ]
+                if cursor is not None:
+                    queries.append(Query.cursor_after(cursor))
+                result = self.database.list_documents(
+                    database_id=self.database_id,
+                    collection_id=self.collection_id,
+                    queries=queries
+                )
+                documents = result['documents']
+                # Sharded repositories have several documents; sum them
+                for doc in documents:
+                    counts[doc['repository']] += doc['count']
+                if len(documents) < self.PAGE_SIZE:
+                    break
+                cursor = documents[-1]['$id']
+        return counts
+
+    def _document_id(self, repo: str, shard: int = 0) -> str:
+        # Deterministic id, so the repository name acts as a unique key: of
+        # two concurrent first views, only one create can succeed
+        document_id = 'r' + hashlib.blake2b(repo.encode(), digest_size=16).hexdigest()
+        return f"{document_id}-{shard}" if shard else document_id
+
+    def _find_document_id(self, repo: str):
+        # Shard 0's document, which has the deterministic id unless it was
+        # created before deterministic ids
+        document_id = self._document_id(repo)
+        try:
+            self.database.get_document(
+                database_id=self.database_id,
+                collection_id=self.collection_id,
+                document_id=document_id
+            )
+            return document_id
+        except AppwriteException as e:
+            if e.code != 404:
+                raise
+
+        # Legacy documents have random ids; the query also matches shard
+        # documents, which are skipped
+        result = self.database.list_documents(
+            database_id=self.database_id,
+            collection_id=self.collection_id,
+            queries=[Query.equal('repository', repo), Query.select(['$id']), Query.limit(100)]
+        )
+        for doc in result['documents']:
+            if not doc['$id'].startswith(document_id + '-'):
+                return doc['$id']
+        return None
+
+    def add_count(self, repo: str, delta: int, shard: int = 0) -> int:
+        # Increments happen server-side, so concurrent writers from any
+        # number of workers can't overwrite each other's views
+        with self._document_ids_lock:
+            document_id = self._document_ids.get((repo, shard))
+        if document_id is None:
+            if shard == 0:
+                document_id = self._find_document_id(repo)
+            if document_id is None:
+                document_id = self._document_id(repo, shard)
+                created = self._create_counter(repo, document_id, delta)
+                with self._document_ids_lock:
+                    self._document_ids.set((repo, shard), document_id)
+                if created:
+                    return delta
+            with self._document_ids_lock:
+                self._document_ids.set((repo, shard), document_id)
+
+        doc = self.database.increment_document_attribute(
+            database_id=self.database_id,
+            collection_id=self.collection_id,
+            document_id=document_id,
+            attribute='count',
+            value=delta
+        )
+        return doc['count']
+
+    def _create_counter(self, repo: str, document_id: str, count: int) -> bool:
+        try:
+            self.database.create_document(
+                database_id=self.database_id,
+                collection_id=self.collection_id,
+                document_id=document_id,
+                data={
+                    'repository': repo,
+                    'count': count,
+                    'last_updated': datetime.now().isoformat()
+                }
+            )
+            return True
+        except AppwriteException as e:
+            # 409: another request created the document first
+            if e.code != 409:
+                raise
+            return False
+
+    def record_visit(self, visitor_id: str, username: str, ip: str, user_agent: str, referrer: str, last_visit: str):
+        # The document id is derived from the visitor key, so a visit is a
+        # primary-key update rather than a query on the visitor collection
+        document_id = 'v' + visitor_id
+        data = {'last_visit': last_visit, 'referrer': referrer}
+        try:
+            self._update_visit(document_id, data)
+            return
+        except AppwriteException as e:
+            if e.code != 404:
+                raise
+
+        try:
+            self.database.create_document(
+                database_id=self.database_id,
+                collection_id=self.ip_collection_id,
+                document_id=document_id,
+                data={
+                    'visitor_id': visitor_id,
+                    'ip': ip,
+                    'username': username,
+                    'user_agent': user_agent,
+                    **data
+                }
+            )
+        except AppwriteException as e:
+            # 409: a concurrent visit created it first
+            if e.code != 409:
+                raise
+            self._update_visit(document_id, data)
+
+    def _update_visit(self, document_id: str, data: dict):
+        self.database.update_document(
+            database_id=self.database_id,
+            collection_id=self.ip_collection_id,
+            document_id=document_id,
+            data=data
+        )
+
+    def list_expired_visits(self, before: str, limit: int) -> List[str]:
+        result = self.database.list_documents(
+            database_id=self.database_id,
+            collection_id=self.ip_collection_id,
+            queries=[Query.less_than('last_visit', before), Query.select(['$id']), Query.limit(limit)]
+        )
+        return [doc['$id'] for doc in result['documents']]
+
+    def delete_visit(self, visit_id: str, before: str):
+        try:
+            self.database.delete_document(
+                database_id=self.database_id,
+                collection_id=self.ip_collection_id,
+                document_id=visit_id
+            )
+        except AppwriteException as e:
+            # 404: already deleted by another worker
+            if e.code != 404:
+                raise
+
+    def _get_blob(self, collection_id: str, repo: str, attribute: str) -> Optional[bytes]:
+        # Binary per-repository values are stored base64-encoded in a
+        # string attribute
+        try:
+            doc = self.database.get_document(
+                database_id=self.database_id,
+                collection_id=collection_id,
+                document_id=self._document_id(repo)
+            )
+        except AppwriteException as e:
+            if e.code != 404:
+                raise
+            return None
+        return base64.b64decode(doc[attribute])
+
+    def _put_blob(self, collection_id: str, repo: str, attribute: str, value: bytes, exists: bool) -> bool:
+        # Returns False if the document had to be created but another
+        # writer created it first
+        data = {attribute: base64.b64encode(value).decode()}
+        if exists:
+            self.database.update_document(
+                database_id=self.database_id,
+                collection_id=collection_id,
+                document_id=self._document_id(repo),
+                data=data
+            )
+            return True
+        try:
+            self.database.create_document(
+                database_id=self.database_id,
+                collection_id=collection_id,
+                document_id=self._document_id(repo),
+                data={'repository': repo, **data}
+            )
+        except AppwriteException as e:
+            if e.code != 409:
+                raise
+            return False
+        return True
+
+    def fetch_sketch(self, repo: str) -> Optional[bytes]:
+        return self._get_blob(self.sketch_collection_id, repo, 'registers')
+
+    def merge_sketch(self, repo: str, registers: bytes) -> bytes:
+        # Not atomic: a concurrent merge can overwrite this one. Every
+        # worker keeps its own sketch and merges it again on each flush,
+        # and merging is idempotent, so lost registers come back.
+        while True:
+            stored = self.fetch_sketch(repo)
+            sketch = HyperLogLog(stored)
+            changed = sketch.merge(registers)
+            if stored is not None and not changed:
+                return bytes(sketch)
+            if self._put_blob(self.sketch_collection_id, repo, 'registers', bytes(sketch), stored is not None):
+                return bytes(sketch)
+
+    def fetch_history(self, repo: str) -> Optional[bytes]:
+        return self._get_blob(self.history_collection_id, repo, 'history')
+
+    def add_history(self, repo: str, deltas: Dict[int, int]):
+        # Read-modify-write, so two workers flushing the same repository at
+        # the same moment can drop one flush's hourly deltas. Totals are
+        # unaffected; each worker writes history only every
+        # HISTORY_FLUSH_INTERVAL seconds, which keeps that window small.
+        while True:
+            stored = self.fetch_history(repo)
+            history = History(stored)
+            history.merge(deltas)
+            if self._put_blob(self.history_collection_id, repo, 'history', bytes(history), stored is not None):
+                return
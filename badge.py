@@ -1,4 +1,19 @@
-def format_number(count: int) -> str:
+import gzip
+import hashlib
+import os
+import re
+from typing import Optional
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def format_number(count: Optional[int]) -> str:
+    # None is an unknown count (storage unreachable, nothing cached)
+    if count is None:
+        return "n/a"
     if count < 1000:
         return str(count)
     elif count < 1000000:
@@ -43,114 +58,284 @@ FONTS = {
     "roboto": "Roboto,sans-serif"
 }
 
-def generate_badge(
-    count: int,
-    style: str = "flat",
-    theme: str = "default",
-    label: str = "Views",
-    size: str = "normal",
-    font: str = "default",
-    animation: str = "none",
-    reverse: bool = False
-) -> str:
-    count_str = format_number(count)
-    
-    colors = THEMES.get(theme, THEMES["default"])
-    font_family = FONTS.get(font, FONTS["default"])
-    
-    if size == "small":
-        height = 16
-        font_size = 9
-        padding = 3
-        max_label_length = 10
-    elif size == "large":
-        height = 24
-        font_size = 13
-        padding = 5
-        max_label_length = 20
-    else:  # normal
-        height = 20
-        font_size = 11
-        padding = 4
-        max_label_length = 15
-
-    label = truncate_text(label, max_label_length)
-    
-    label_width = len(label) * (font_size - 3) + (padding * 2)
-    count_width = len(count_str) * (font_size - 3) + (padding * 2)
-    total_width = label_width + count_width
-
-    first_width = count_width if reverse else label_width
-    second_width = label_width if reverse else count_width
-    first_text = count_str if reverse else label
-    second_text = label if reverse else count_str
-
-    base_gradients = f'''
-        <defs>
-            <linearGradient id="grad1" x1="0%" y1="0%" x2="100%" y2="0%">
-                <stop offset="0%" style="stop-color:#00356B;stop-opacity:1" />
-                <stop offset="100%" style="stop-color:#1E90FF;stop-opacity:1" />
-            </linearGradient>
-            <linearGradient id="grad2" x1="0%" y1="0%" x2="100%" y2="0%">
-                <stop offset="0%" style="stop-color:#2ea44f;stop-opacity:1" />
-                <stop offset="100%" style="stop-color:#32CD32;stop-opacity:1" />
-            </linearGradient>
-            <linearGradient id="grad3" x1="0%" y1="0%" x2="100%" y2="0%">
-                <stop offset="0%" style="stop-color:#6f42c1;stop-opacity:1" />
-                <stop offset="100%" style="stop-color:#DA70D6;stop-opacity:1" />
-            </linearGradient>
-            <linearGradient id="grad4" x1="0%" y1="0%" x2="100%" y2="0%">
-                <stop offset="0%" style="stop-color:#FF69B4;stop-opacity:1" />
-                <stop offset="100%" style="stop-color:#FF1493;stop-opacity:1" />
-            </linearGradient>
-            <linearGradient id="rainbow1" x1="0%" y1="0%" x2="100%" y2="0%">
-                <stop offset="0%" style="stop-color:#FF0000;stop-opacity:1" />
-                <stop offset="33%" style="stop-color:#FF00FF;stop-opacity:1" />
-                <stop offset="66%" style="stop-color:#0000FF;stop-opacity:1" />
-                <stop offset="100%" style="stop-color:#00FFFF;stop-opacity:1" />
-            </linearGradient>
-            <linearGradient id="rainbow2" x1="0%" y1="0%" x2="100%" y2="0%">
-                <stop offset="0%" style="stop-color:#00FF00;stop-opacity:1" />
-                <stop offset="50%" style="stop-color:#FFFF00;stop-opacity:1" />
-                <stop offset="100%" style="stop-color:#FFA500;stop-opacity:1" />
-            </linearGradient>
-        </defs>
-    '''
+GRADIENTS = {
+    "grad1": [("0%", "#00356B"), ("100%", "#1E90FF")],
+    "grad2": [("0%", "#2ea44f"), ("100%", "#32CD32")],
+    "grad3": [("0%", "#6f42c1"), ("100%", "#DA70D6")],
+    "grad4": [("0%", "#FF69B4"), ("100%", "#FF1493")],
+    "rainbow1": [("0%", "#FF0000"), ("33%", "#FF00FF"), ("66%", "#0000FF"), ("100%", "#00FFFF")],
+    "rainbow2": [("0%", "#00FF00"), ("50%", "#FFFF00"), ("100%", "#FFA500")]
+}
 
-    animation_style = ""
-    if animation == "pulse":
-        animation_style = '''
+SIZES = {
+    "small": {"height": 16, "font_size": 9, "padding": 3, "max_label_length": 10},
+    "normal": {"height": 20, "font_size": 11, "padding": 4, "max_label_length": 15},
+    "large": {"height": 24, "font_size": 13, "padding": 5, "max_label_length": 20}
+}
+
+ANIMATIONS = {
+    "pulse": '''
             @keyframes pulse {
                 0% { opacity: 1; }
                 50% { opacity: 0.7; }
                 100% { opacity: 1; }
             }
-        '''
-    elif animation == "bounce":
-        animation_style = '''
+        ''',
+    "bounce": '''
             @keyframes bounce {
                 0% { transform: translateY(0); }
                 50% { transform: translateY(-2px); }
                 100% { transform: translateY(0); }
             }
-        '''
-    elif animation == "glow":
-        animation_style = '''
+        ''',
+    "glow": '''
             @keyframes glow {
                 0% { filter: brightness(1); }
                 50% { filter: brightness(1.2); }
                 100% { filter: brightness(1); }
             }
         '''
+}
+
+# Rendered badge bodies keyed on every input that affects the output and
+# the content encoding. Counts are keyed by their formatted string, so e.g.
+# every count from 1250 to 1349 shares the "1.3k" entry.
+badge_cache = LRUCache(int(os.getenv('BADGE_CACHE_SIZE', '4096')))
+
+def generate_badge(
+    count: int,
+    style: str = "flat",
+    theme: str = "default",
+    label: str = "Views",
+    size: str = "normal",
+    font: str = "default",
+    animation: str = "none",
+    reverse: bool = False,
+    compact: bool = False,
+    history: tuple = ()
+) -> str:
+    return badge_svg(badge_key(count, style, theme, label, size, font, animation, reverse, compact, history))
+
+def badge_key(
+    count: Optional[int],
+    style: str = "flat",
+    theme: str = "default",
+    label: str = "Views",
+    size: str = "normal",
+    font: str = "default",
+    animation: str = "none",
+    reverse: bool = False,
+    compact: bool = False,
+    history: tuple = ()
+) -> tuple:
+    # Only the sparkline draws the history; other styles share one entry
+    if style != "sparkline":
+        history = ()
+    return (style, theme, label, size, font, animation, reverse, compact, format_number(count), tuple(history))
+
+def badge_svg(key: tuple) -> str:
+    return badge_bytes(key).decode()
+
+def badge_bytes(key: tuple, encoding: str = "identity") -> bytes:
+    # Compressed variants are computed once per badge and cached next to
+    # the SVG, so hot badges cost no compression CPU per response
+    body = badge_cache.get((key, encoding))
+    if body is None:
+        if encoding == "identity":
+            body = _render_badge(*key).encode()
+        elif encoding == "br":
+            body = brotli.compress(badge_bytes(key), quality=11)
+        else:
+            body = gzip.compress(badge_bytes(key), compresslevel=9, mtime=0)
+        badge_cache.set((key, encoding), body)
+    return body
+
+def badge_etag(key: tuple, encoding: str = "identity") -> str:
+    # Strong validator: the key and encoding determine the bytes exactly
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+    if encoding != "identity":
+        digest += f"-{encoding}"
+    return f'"{digest}"'
+
+_WIDTH = re.compile(r'width="([\d.]+)"')
+_LOCAL_IDS = re.compile(r'(id="|url\(#)([ab])\b')
+
+def stack_badges(svgs: list, gap: int = 4) -> str:
+    # One SVG with the given badges as rows. Each badge's mask and overlay
+    # ids ("a", "b") are made unique so rows don't clip each other.
+    rows = []
+    width = 0
+    y = 0
+    for i, svg in enumerate(svgs):
+        svg = _LOCAL_IDS.sub(lambda m: f"{m.group(1)}r{i}{m.group(2)}", svg)
+        height = int(float(re.search(r'height="([\d.]+)"', svg).group(1)))
+        width = max(width, int(float(_WIDTH.search(svg).group(1))))
+        rows.append(svg.replace("<svg ", f'<svg y="{y}" ', 1))
+        y += height + gap
+    height = max(y - gap, 0)
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">{"".join(rows)}</svg>'
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def badge_layout(style: str, theme: str, label: str, size: str, reverse: bool, count_str: str) -> tuple:
+    # Normalizes the options and measures the two halves of a badge.
+    # Returns (style, theme, size, reverse, first_text, second_text,
+    # first_width, second_width).
+    if style not in STYLES:
+        style = "flat"
+    if size not in SIZES:
+        size = "normal"
+    if theme not in THEMES:
+        theme = "default"
+    reverse = reverse and style in REVERSIBLE_STYLES
+
+    dims = SIZES[size]
+    char_width = dims["font_size"] - 3
+    label = truncate_text(label, dims["max_label_length"])
+
+    label_width = len(label) * char_width + (dims["padding"] * 2)
+    count_width = len(count_str) * char_width + (dims["padding"] * 2)
+
+    if reverse:
+        return style, theme, size, reverse, count_str, label, count_width, label_width
+    return style, theme, size, reverse, label, count_str, label_width, count_width
+
+def _render_badge(
+    style: str,
+    theme: str,
+    label: str,
+    size: str,
+    font: str,
+    animation: str,
+    reverse: bool,
+    compact: bool,
+    count_str: str,
+    history: tuple = ()
+) -> str:
+    style, theme, size, reverse, first_text, second_text, first_width, second_width = badge_layout(
+        style, theme, label, size, reverse, count_str
+    )
+    compact = bool(compact)
+    template = _RENDERERS.get((style, size, theme, reverse, compact))
+    if template is None:
+        template = _compile_renderer(style, size, theme, reverse, compact)
+
+    total_width = first_width + second_width
+    points = ""
+    if style == "sparkline":
+        points = " ".join(
+            f"{x:g},{y:g}"
+            for x, y in sparkline_points(history, total_width, SPARKLINE_WIDTH, SIZES[size]["height"])
+        )
+        total_width += SPARKLINE_WIDTH
+
+    # Arguments follow the order of SLOTS
+    return template(
+        total_width,
+        first_width,
+        second_width,
+        first_width/2,
+        first_width + second_width/2,
+        first_text,
+        second_text,
+        FONTS.get(font, FONTS["default"]),
+        animation,
+        (COMPACT_ANIMATIONS if compact else ANIMATIONS).get(animation, ""),
+        'animated' if animation != 'none' else '',
+        first_width + second_width,
+        points
+    )
+
+# The sparkline style appends a SPARKLINE_WIDTH px chart of daily views
+SPARKLINE_WIDTH = 60
+
+def sparkline_points(history: tuple, x: float, width: float, height: float) -> list:
+    # Chart coordinates for `history` (oldest first) in the box at x with
+    # the given size, scaled so the busiest day touches the top
+    pad = 3
+    values = list(history) or [0]
+    if len(values) == 1:
+        values = values * 2
+    peak = max(values) or 1
+    step = (width - 2 * pad) / (len(values) - 1)
+    return [
+        (round(x + pad + i * step, 1), round(height - pad - value / peak * (height - 2 * pad), 1))
+        for i, value in enumerate(values)
+    ]
+
+# Badge templates are built and compiled on first use for each style, size,
+# theme (and layout, for styles that support reverse), so startup only pays
+# for the badges actually served. Colors, heights and the gradient defs
+# each theme references are baked in, and each template is compiled into a
+# function returning a single f-string, so a render only fills the width,
+# text and count slots.
+STYLES = ("flat", "flat-square", "plastic", "sparkline")
+REVERSIBLE_STYLES = ("flat",)
+SLOTS = (
+    "total_width", "first_width", "second_width", "first_x", "second_x",
+    "first_text", "second_text", "font_family", "animation",
+    "animation_style", "animated_class", "sparkline_x", "sparkline_points"
+)
+
+def _slot(name: str) -> str:
+    return f"\x00{name}\x00"
+
+def _gradient_defs(colors: dict) -> str:
+    ids = [value[5:-1] for value in colors.values() if value.startswith("url(#")]
+    if not ids:
+        return ""
+    gradients = ""
+    for gradient_id in dict.fromkeys(ids):
+        stops = "".join(
+            f'''
+                <stop offset="{offset}" style="stop-color:{color};stop-opacity:1" />'''
+            for offset, color in GRADIENTS[gradient_id]
+        )
+        gradients += f'''
+            <linearGradient id="{gradient_id}" x1="0%" y1="0%" x2="100%" y2="0%">{stops}
+            </linearGradient>'''
+    return f'''
+        <defs>{gradients}
+        </defs>
+    '''
+
+_CSS_PUNCTUATION = re.compile(r" *([{};:]) *")
+_STYLE_BLOCK = re.compile(r"<style>.*?</style>", re.S)
+
+def _minify_css(css: str) -> str:
+    return _CSS_PUNCTUATION.sub(r"\1", " ".join(css.split()))
+
+def _minify(svg: str) -> str:
+    # Templates hold one tag per line, so stripping and joining the lines
+    # removes all indentation. Slot values (label, count) are not part of
+    # the template, so text content is never touched.
+    svg = "".join(line.strip() for line in svg.splitlines()).replace(" />", "/>")
+    return _STYLE_BLOCK.sub(lambda block: _minify_css(block.group()), svg)
+
+def _build_template(style: str, size: str, theme: str, reverse: bool, compact: bool) -> str:
+    colors = THEMES[theme]
+    height = SIZES[size]["height"]
+    font_size = SIZES[size]["font_size"]
+    gradients = THEME_GRADIENTS[theme]
+
+    total_width = _slot("total_width")
+    first_width = _slot("first_width")
+    second_width = _slot("second_width")
+    first_x = _slot("first_x")
+    second_x = _slot("second_x")
+    first_text = _slot("first_text")
+    second_text = _slot("second_text")
+    font_family = _slot("font_family")
 
     if style == "flat":
         svg = f'''
         <svg xmlns="http://www.w3.org/2000/svg" width="{total_width}" height="{height}">
             <style>
-                {animation_style}
-                .animated {{ animation: {animation} 2s infinite; }}
+                {_slot("animation_style")}
+                .animated {{ animation: {_slot("animation")} 2s infinite; }}
             </style>
-            {base_gradients}
+            {gradients}
             <linearGradient id="b" x2="0" y2="100%">
                 <stop offset="0" stop-color="#bbb" stop-opacity=".1"/>
                 <stop offset="1" stop-opacity=".1"/>
@@ -158,35 +343,64 @@ def generate_badge(
             <mask id="a">
                 <rect width="{total_width}" height="{height}" rx="3" fill="#fff"/>
             </mask>
-            <g mask="url(#a)" class="{f'animated' if animation != 'none' else ''}">
+            <g mask="url(#a)" class="{_slot("animated_class")}">
                 <path fill="{colors['count'] if reverse else colors['bg']}" d="M0 0h{first_width}v{height}H0z"/>
                 <path fill="{colors['bg'] if reverse else colors['count']}" d="M{first_width} 0h{second_width}v{height}H{first_width}z"/>
                 <path fill="url(#b)" d="M0 0h{total_width}v{height}H0z"/>
             </g>
             <g fill="{colors['text']}" text-anchor="middle" font-family="{font_family}" font-size="{font_size}">
-                <text x="{first_width/2}" y="{height*0.75}" fill-opacity=".3">{first_text}</text>
-                <text x="{first_width/2}" y="{height*0.7}">{first_text}</text>
-                <text x="{first_width + second_width/2}" y="{height*0.75}" fill-opacity=".3">{second_text}</text>
-                <text x="{first_width + second_width/2}" y="{height*0.7}">{second_text}</text>
+                <text x="{first_x}" y="{height*0.75}" fill-opacity=".3">{first_text}</text>
+                <text x="{first_x}" y="{height*0.7}">{first_text}</text>
+                <text x="{second_x}" y="{height*0.75}" fill-opacity=".3">{second_text}</text>
+                <text x="{second_x}" y="{height*0.7}">{second_text}</text>
+            </g>
+        </svg>
+        '''
+    elif style == "sparkline":
+        sparkline_x = _slot("sparkline_x")
+        svg = f'''
+        <svg xmlns="http://www.w3.org/2000/svg" width="{total_width}" height="{height}">
+            {gradients}
+            <linearGradient id="b" x2="0" y2="100%">
+                <stop offset="0" stop-color="#bbb" stop-opacity=".1"/>
+                <stop offset="1" stop-opacity=".1"/>
+            </linearGradient>
+            <mask id="a">
+                <rect width="{total_width}" height="{height}" rx="3" fill="#fff"/>
+            </mask>
+            <g mask="url(#a)">
+                <path fill="{colors['bg']}" d="M0 0h{first_width}v{height}H0z"/>
+                <path fill="{colors['count']}" d="M{first_width} 0h{second_width}v{height}H{first_width}z"/>
+                <path fill="{colors['bg']}" d="M{sparkline_x} 0h{SPARKLINE_WIDTH}v{height}H{sparkline_x}z"/>
+                <path fill="url(#b)" d="M0 0h{total_width}v{height}H0z"/>
+            </g>
+            <g fill="{colors['text']}" text-anchor="middle" font-family="{font_family}" font-size="{font_size}">
+                <text x="{first_x}" y="{height*0.75}" fill-opacity=".3">{first_text}</text>
+                <text x="{first_x}" y="{height*0.7}">{first_text}</text>
+                <text x="{second_x}" y="{height*0.75}" fill-opacity=".3">{second_text}</text>
+                <text x="{second_x}" y="{height*0.7}">{second_text}</text>
             </g>
+            <polyline fill="none" stroke="{colors['text']}" stroke-width="1.5" stroke-linejoin="round" points="{_slot("sparkline_points")}"/>
         </svg>
         '''
     elif style == "flat-square":
         svg = f'''
         <svg xmlns="http://www.w3.org/2000/svg" width="{total_width}" height="{height}">
+            {gradients}
             <g>
-                <rect fill="{colors['bg']}" width="{label_width}" height="{height}"/>
-                <rect fill="{colors['count']}" x="{label_width}" width="{count_width}" height="{height}"/>
+                <rect fill="{colors['bg']}" width="{first_width}" height="{height}"/>
+                <rect fill="{colors['count']}" x="{first_width}" width="{second_width}" height="{height}"/>
             </g>
             <g fill="{colors['text']}" text-anchor="middle" font-family="{font_family}" font-size="{font_size}">
-                <text x="{label_width/2}" y="{height*0.7}">{label}</text>
-                <text x="{label_width + count_width/2}" y="{height*0.7}">{count_str}</text>
+                <text x="{first_x}" y="{height*0.7}">{first_text}</text>
+                <text x="{second_x}" y="{height*0.7}">{second_text}</text>
             </g>
         </svg>
         '''
-    elif style == "plastic":
+    else:  # plastic
         svg = f'''
         <svg xmlns="http://www.w3.org/2000/svg" width="{total_width}" height="{height}">
+            {gradients}
             <linearGradient id="b" x2="0" y2="100%">
                 <stop offset="0" stop-color="#fff" stop-opacity=".7"/>
                 <stop offset=".1" stop-color="#aaa" stop-opacity=".1"/>
@@ -197,17 +411,38 @@ def generate_badge(
                 <rect width="{total_width}" height="{height}" rx="4" fill="#fff"/>
             </mask>
             <g mask="url(#a)">
-                <path fill="{colors['bg']}" d="M0 0h{label_width}v{height}H0z"/>
-                <path fill="{colors['count']}" d="M{label_width} 0h{count_width}v{height}H{label_width}z"/>
+                <path fill="{colors['bg']}" d="M0 0h{first_width}v{height}H0z"/>
+                <path fill="{colors['count']}" d="M{first_width} 0h{second_width}v{height}H{first_width}z"/>
                 <path fill="url(#b)" d="M0 0h{total_width}v{height}H0z"/>
             </g>
             <g fill="{colors['text']}" text-anchor="middle" font-family="{font_family}" font-size="{font_size}">
-                <text x="{label_width/2}" y="{height*0.7}">{label}</text>
-                <text x="{label_width + count_width/2}" y="{height*0.7}">{count_str}</text>
+                <text x="{first_x}" y="{height*0.7}">{first_text}</text>
+                <text x="{second_x}" y="{height*0.7}">{second_text}</text>
             </g>
         </svg>
         '''
-    else:
-        svg = generate_badge(count, "flat", theme, label, size, font, animation, reverse)
 
-    return svg.strip() 
\ No newline at end of file
+    # Escape the literal braces (CSS) and turn the slot markers into
+    # f-string fields
+    svg = _minify(svg) if compact else svg.strip()
+    template = svg.replace("{", "{{").replace("}", "}}")
+    parts = template.split("\x00")
+    for i in range(1, len(parts), 2):
+        parts[i] = "{" + parts[i] + "}"
+    return "".join(parts)
+
+def _compile_renderer(style: str, size: str, theme: str, reverse: bool, compact: bool):
+    key = (style, size, theme, reverse, compact)
+    template = _build_template(style, size, theme, reverse, compact)
+    source = f"def render({', '.join(SLOTS)}):\n    return f{template!r}"
+    namespace = {}
+    exec(compile(source, f"<badge {style}/{size}/{theme}>", "exec"), namespace)
+    _RENDERERS[key] = namespace["render"]
+    return namespace["render"]
+
+_RENDERERS = {}
+
+# Gradient defs per theme, shared by every template of that theme
+THEME_GRADIENTS = {theme: _gradient_defs(colors) for theme, colors in THEMES.items()}
+
+COMPACT_ANIMATIONS = {name: _minify_css(css) for name, css in ANIMATIONS.items()}
@@ -0,0 +1,371 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+RENDER_CASES = [
+    ("flat", "default", "Views", "normal", "default", "none", False, False, "1.2k"),
+    ("flat", "rainbow", "Views", "large", "fira", "pulse", True, False, "12"),
+    ("flat-square", "dark", "Views", "normal", "default", "none", False, False, "999"),
+    ("plastic", "gradient-blue", "Visitors", "small", "mono", "none", False, False, "3.4M")
+]
+
+def bench_render(number: int = 20000):
+    from badge import _render_badge, generate_badge
+
+    print("badge render (uncached)")
+    for case in RENDER_CASES:
+        _render_badge(*case)
+        seconds = timeit.timeit(lambda: _render_badge(*case), number=number)
+        print(f"  {case[0]:12} {case[1]:14} {seconds / number * 1e6:7.2f} us/render")
+
+    seconds = timeit.timeit(lambda: generate_badge(1234, theme="rainbow"), number=number)
+    print(f"  {'cached':27} {seconds / number * 1e6:7.2f} us/render")
+
+def bench_size():
+    from badge import badge_bytes, supported_encodings
+
+    print("badge size (bytes)")
+    encodings = ("identity",) + supported_encodings()
+    print(f"  {'':27} {'pretty':>8} " + " ".join(f"{'compact ' + e:>16}" for e in encodings))
+    for case in RENDER_CASES:
+        pretty = len(badge_bytes(case))
+        compact = [len(badge_bytes(case[:7] + (True,) + case[8:], e)) for e in encodings]
+        print(f"  {case[0]:12} {case[1]:14} {pretty:8} " + " ".join(f"{n:16}" for n in compact))
+
+def bench_increment(requests: int = 5000, repos: int = 10):
+    # Runs offline against a throwaway SQLite database
+    from database import CounterDB
+    from storage import SQLiteBackend
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            db = CounterDB(SQLiteBackend(os.path.join(tmp, "views.db")))
+            start = time.perf_counter()
+            await asyncio.gather(*[db.increment_views(f"bench/repo{i % repos}") for i in range(requests)])
+            elapsed = time.perf_counter() - start
+            await db.close()
+        print("increment_views (sqlite)")
+        print(f"  {requests} increments over {repos} repos: {elapsed * 1e3:.1f} ms, {requests / elapsed:,.0f}/s")
+
+    asyncio.run(run())
+
+def _stress_worker(path: str, tasks: int, increments: int):
+    from database import CounterDB
+    from storage import SQLiteBackend
+
+    async def hammer(db):
+        for _ in range(increments):
+            await db.increment_views("stress/repo")
+
+    async def run():
+        db = CounterDB(SQLiteBackend(path))
+        await asyncio.gather(*[hammer(db) for _ in range(tasks)])
+        await db.close()
+
+    asyncio.run(run())
+
+def bench_stress(workers: int = 4, tasks: int = 50, increments: int = 20):
+    # Many processes (like uvicorn workers), each with many concurrent
+    # tasks, all incrementing one repository; no view may be lost
+    from storage import SQLiteBackend
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "views.db")
+        SQLiteBackend(path).close()
+        start = time.perf_counter()
+        processes = [
+            multiprocessing.Process(target=_stress_worker, args=(path, tasks, increments))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        backend = SQLiteBackend(path)
+        count = backend.fetch_count("stress/repo")
+        backend.close()
+
+    expected = workers * tasks * increments
+    print("concurrent increments (sqlite)")
+    print(f"  {workers} processes x {tasks} tasks x {increments} increments: {elapsed * 1e3:.1f} ms")
+    print(f"  final count {count}, expected {expected}")
+    if count != expected:
+        sys.exit(f"lost {expected - count} increments")
+
+_JOURNAL_WRITER = """
+import sys, time
+sys.path.insert(0, %r)
+from journal import Journal
+journal = Journal(%r)
+for _ in range(%d):
+    journal.append("journal/repo", 1)
+journal.sync()
+print("ready", flush=True)
+time.sleep(60)
+"""
+
+def bench_journal(views: int = 1000):
+    # Two processes sharing JOURNAL_DIR: a live worker's journal is neither
+    # replayed nor deleted by another, and is replayed exactly once after
+    # that worker crashes
+    import signal
+    import subprocess
+    from journal import Journal
+
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        here = os.path.dirname(os.path.abspath(__file__))
+        writer = subprocess.Popen(
+            [sys.executable, "-c", _JOURNAL_WRITER % (here, root, views)],
+            stdout=subprocess.PIPE, text=True
+        )
+        writer.stdout.readline()
+
+        other = Journal(root)
+        if other.replay():
+            failures.append("replayed a live worker's journal")
+        other.append("journal/other", 1)
+        other.discard(other.rotate())
+
+        writer.send_signal(signal.SIGKILL)
+        writer.wait()
+        start = time.perf_counter()
+        restarted = Journal(root)
+        replayed = restarted.replay()
+        elapsed = time.perf_counter() - start
+        if replayed != {"journal/repo": views}:
+            failures.append(f"replay after crash returned {replayed}")
+        restarted.discard(restarted.rotate())
+        if Journal(root).replay():
+            failures.append("replayed a journal that was already stored")
+        other.close()
+
+    print("journal shared by processes")
+    print(f"  replay of {views} views from a crashed worker: {elapsed * 1e3:.1f} ms")
+    if failures:
+        sys.exit("; ".join(failures))
+    print("  live journals untouched, crashed journal replayed once")
+
+class _FakeDatabases:
+    # In-memory stand-in for the Appwrite Databases service with the
+    # server's guarantees: document ids are unique (409 on a second create)
+    # and increments are atomic. Calls sleep briefly, like a round-trip, so
+    # concurrent clients interleave.
+    def __init__(self, latency: float = 0.0005):
+        import threading
+
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.documents = {}
+
+    def list_documents(self, database_id, collection_id, queries=None):
+        import json
+
+        time.sleep(self.latency)
+        filters = {}
+        limit = 25
+        for query in map(json.loads, queries or []):
+            if query["method"] == "equal":
+                filters[query["attribute"]] = query["values"]
+            elif query["method"] == "limit":
+                limit = query["values"][0]
+        with self.lock:
+            matches = [
+                dict(doc) for doc in self.documents.values()
+                if all(doc.get(name) in values for name, values in filters.items())
+            ]
+        return {"total": len(matches), "documents": matches[:limit]}
+
+    def get_document(self, database_id, collection_id, document_id):
+        from appwrite.exception import AppwriteException
+
+        time.sleep(self.latency)
+        with self.lock:
+            doc = self.documents.get(document_id)
+            if doc is None:
+                raise AppwriteException("Document not found", 404)
+            return dict(doc)
+
+    def create_document(self, database_id, collection_id, document_id, data):
+        from appwrite.exception import AppwriteException
+
+        time.sleep(self.latency)
+        with self.lock:
+            if document_id in self.documents:
+                raise AppwriteException("Document already exists", 409)
+            self.documents[document_id] = {"$id": document_id, **data}
+            return dict(self.documents[document_id])
+
+    def increment_document_attribute(self, database_id, collection_id, document_id, attribute, value=1):
+        from appwrite.exception import AppwriteException
+
+        time.sleep(self.latency)
+        with self.lock:
+            doc = self.documents.get(document_id)
+            if doc is None:
+                raise AppwriteException("Document not found", 404)
+            doc[attribute] += value
+            return dict(doc)
+
+def _stress_appwrite(workers: int, tasks: int, increments: int):
+    # Workers are separate CounterDB/AppwriteBackend instances (each with
+    # its own document-id cache) sharing one fake server, all racing to
+    # create the repository's counter and, once it is hot, its shards
+    os.environ.setdefault("APPWRITE_ENDPOINT", "http://localhost/v1")
+    from appwrite_backend import AppwriteBackend
+    from database import CounterDB
+    from sharding import ShardRouter
+    import threading
+
+    server = _FakeDatabases()
+
+    async def hammer(db):
+        for _ in range(increments):
+            await db.increment_views("stress/repo")
+
+    async def run():
+        backend = AppwriteBackend()
+        backend.database = server
+        db = CounterDB(backend)
+        db.shards = ShardRouter(shards=4, hot_rate=tasks * increments / 20)
+        await asyncio.gather(*[hammer(db) for _ in range(tasks)])
+        await db.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=asyncio.run, args=(run(),)) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    backend = AppwriteBackend()
+    backend.database = server
+    return elapsed, backend.fetch_count("stress/repo"), len(server.documents)
+
+def bench_stress_appwrite(workers: int = 4, tasks: int = 50, increments: int = 20):
+    elapsed, count, documents = _stress_appwrite(workers, tasks, increments)
+    expected = workers * tasks * increments
+    print("concurrent increments (appwrite, fake server)")
+    print(f"  {workers} workers x {tasks} tasks x {increments} increments: {elapsed * 1e3:.1f} ms")
+    print(f"  final count {count} over {documents} documents, expected {expected}")
+    if count != expected:
+        sys.exit(f"lost {expected - count} increments")
+
+class _FunctionRequest:
+    def __init__(self, path: str, headers: dict):
+        self.method = "GET"
+        self.path = path
+        self.query = {}
+        self.headers = headers
+
+class _FunctionResponse:
+    def binary(self, body, status=200, headers=None):
+        return status, headers, body
+
+    def json(self, body, status=200, headers=None):
+        return status, headers, body
+
+class _FunctionContext:
+    def __init__(self, path: str, headers: dict):
+        self.req = _FunctionRequest(path, headers)
+        self.res = _FunctionResponse()
+
+def _load_function():
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "functions", "github-view-counter", "main.py")
+    spec = importlib.util.spec_from_file_location("function_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _time_to_first_badge():
+    # Runs in a fresh interpreter: handler import plus the first invocation
+    start = time.perf_counter()
+    function = _load_function()
+    asyncio.run(function.main(_FunctionContext("/badge/bench/repo", {"user-agent": "bench", "x-forwarded-for": "10.0.0.1"})))
+    print(f"{(time.perf_counter() - start) * 1e3:.1f}")
+
+def bench_function(invocations: int = 2000):
+    # The Appwrite Function handler against a throwaway SQLite database
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(STORAGE_BACKEND="sqlite", SQLITE_PATH=os.path.join(tmp, "views.db"))
+        function = _load_function()
+
+        async def run():
+            contexts = [
+                _FunctionContext("/badge/bench/repo", {"user-agent": f"bench {i}", "x-forwarded-for": f"10.0.{i // 250}.{i % 250}"})
+                for i in range(invocations)
+            ]
+            await function.main(contexts[0])
+            start = time.perf_counter()
+            for context in contexts:
+                await function.main(context)
+            elapsed = time.perf_counter() - start
+            await function.db.close()
+            return elapsed
+
+        elapsed = asyncio.run(run())
+
+    print("appwrite function (sqlite)")
+    print(f"  {invocations} counted invocations: {elapsed / invocations * 1e6:.1f} us/invocation")
+
+def bench_startup(runs: int = 5, top: int = 12):
+    # Cold start of the Appwrite Function: time to first badge in fresh
+    # interpreters, and where import time goes (python -X importtime)
+    import statistics
+    import subprocess
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "STORAGE_BACKEND": "sqlite", "SQLITE_PATH": os.path.join(tmp, "views.db")}
+        code = "import bench; bench._time_to_first_badge()"
+        first_badge = []
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", code],
+                env=env, capture_output=True, text=True, check=True
+            )
+            first_badge.append(float(result.stdout.split()[-1]))
+
+        # Cumulative microseconds per top-level import of the last run
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line[12:]:
+                continue
+            _, cumulative, name = line[12:].split("|")
+            if cumulative.strip().isdigit() and not name.startswith("   "):
+                imports.append((int(cumulative), name.strip()))
+
+        sdk = subprocess.run(
+            [sys.executable, "-c", "import time; t = time.perf_counter(); import appwrite_backend; print((time.perf_counter() - t) * 1e3)"],
+            env=env, capture_output=True, text=True
+        )
+
+    print("cold start (appwrite function, sqlite)")
+    print(f"  time to first badge: {statistics.median(first_badge):.1f} ms (median of {runs})")
+    if sdk.returncode == 0:
+        print(f"  appwrite backend import (not loaded for sqlite): {float(sdk.stdout):.1f} ms")
+    print("  slowest top-level imports:")
+    for cumulative, name in sorted(imports, reverse=True)[:top]:
+        print(f"    {name:32} {cumulative / 1e3:7.1f} ms")
+
+BENCHMARKS = {
+    "render": bench_render,
+    "size": bench_size,
+    "increment": bench_increment,
+    "stress": bench_stress,
+    "stress-appwrite": bench_stress_appwrite,
+    "journal": bench_journal,
+    "function": bench_function,
+    "startup": bench_startup
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
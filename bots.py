@@ -0,0 +1,45 @@
+import os
+import re
+from cache import LRUCache
+
+# User-agent fragments of clients whose hits shouldn't count as views:
+# crawlers, link unfurlers, uptime checkers and plain HTTP libraries.
+# Matched case-insensitively anywhere in the user agent.
+DEFAULT_BOT_PATTERNS = [
+    "bot", "crawler", "spider", "slurp", "archiver", "headless", "lighthouse",
+    "facebookexternalhit", "facebookcatalog", "whatsapp", "embedly", "skypeuripreview",
+    "vkshare", "pinterest", "redditbot", "mastodon", "preview",
+    "curl/", "wget/", "python-requests", "python-urllib", "aiohttp", "httpx",
+    "go-http-client", "okhttp", "java/", "libwww-perl", "node-fetch", "axios/",
+    "uptimerobot", "pingdom", "statuscake", "site24x7", "kube-probe",
+    "elb-healthchecker", "googlestackdrivermonitoring", "monitor"
+]
+
+# BOT_USER_AGENTS replaces the default list (comma-separated fragments)
+BOT_PATTERNS = [
+    pattern.strip().lower()
+    for pattern in os.getenv('BOT_USER_AGENTS', ','.join(DEFAULT_BOT_PATTERNS)).split(',')
+    if pattern.strip()
+]
+
+# One alternation over every fragment, so a user agent is scanned once
+# regardless of how long the list is. Matching a lowercased user agent is
+# several times faster than re.IGNORECASE.
+_BOT_RE = re.compile('|'.join(re.escape(pattern) for pattern in BOT_PATTERNS)) if BOT_PATTERNS else None
+
+# The same few user agents make most requests
+_verdicts = LRUCache(4096)
+
+def is_bot(user_agent: str) -> bool:
+    verdict = _verdicts.get(user_agent)
+    if verdict is None:
+        # GitHub's image proxy fetches badges on behalf of README
+        # viewers, so its hits are the views we want to count
+        lowered = user_agent.lower()
+        verdict = (
+            _BOT_RE is not None
+            and "github-camo" not in lowered
+            and _BOT_RE.search(lowered) is not None
+        )
+        _verdicts.set(user_agent, verdict)
+    return verdict
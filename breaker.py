@@ -0,0 +1,57 @@
+import time
+from typing import Optional
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    # The call outlived its deadline but may still complete; `future`
+    # resolves with its eventual outcome
+    def __init__(self, message: str, future):
+        super().__init__(message)
+        self.future = future
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive failed backend calls and
+    # rejects calls outright for `reset_timeout` seconds. After that a
+    # single trial call is let through: success closes the circuit, failure
+    # opens it again.
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self._trial = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
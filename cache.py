@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+import logs
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self.entries.pop(key, default)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class CountCache:
+    # Read-through cache with stale-while-revalidate: an expired entry is
+    # still returned immediately, and a single background task per key
+    # reloads it. Loader errors leave the stale value in place.
+    def __init__(self, ttl: float = 10, max_entries: int = 10000):
+        self.ttl = ttl
+        self.entries = LRUCache(max_entries)
+        self.stale = 0
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[Hashable], Awaitable[Any]]) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            value = await loader(key)
+            self.set(key, value)
+            return value
+
+        value, fetched_at = entry
+        if time.monotonic() - fetched_at >= self.ttl:
+            self.stale += 1
+            self._revalidate(key, loader)
+        return value
+
+    def update(self, key: Hashable, value: Any, loader: Callable[[Hashable], Awaitable[Any]]):
+        # Replaces the value but keeps its age, so the entry still goes
+        # stale, and starts the background reload once it has (a new key is
+        # stale at once)
+        entry = self.entries.entries.get(key)
+        fetched_at = entry[1] if entry is not None else float("-inf")
+        self.entries.set(key, (value, fetched_at))
+        if time.monotonic() - fetched_at >= self.ttl:
+            self._revalidate(key, loader)
+
+    def _revalidate(self, key: Hashable, loader: Callable[[Hashable], Awaitable[Any]]):
+        if key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(self._refresh(key, loader))
+
+    async def get_many(
+        self,
+        keys: Iterable[Hashable],
+        loader: Callable[[list], Awaitable[Dict[Hashable, Any]]]
+    ) -> Dict[Hashable, Any]:
+        # Like get() for several keys, with one loader call for all misses
+        # and one background call for all stale entries
+        values = {}
+        missing = []
+        stale = []
+        now = time.monotonic()
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                missing.append(key)
+                continue
+            values[key] = entry[0]
+            if now - entry[1] >= self.ttl and key not in self._refreshing:
+                stale.append(key)
+
+        if stale:
+            self.stale += len(stale)
+            task = asyncio.create_task(self._refresh_many(stale, loader))
+            for key in stale:
+                self._refreshing[key] = task
+        if missing:
+            loaded = await loader(missing)
+            for key in missing:
+                self.set(key, loaded[key])
+                values[key] = loaded[key]
+        return values
+
+    async def _refresh_many(self, keys: list, loader: Callable[[list], Awaitable[Dict[Hashable, Any]]]):
+        try:
+            for key, value in (await loader(keys)).items():
+                self.set(key, value)
+        except Exception as e:
+            logs.error("cache_refresh_failed", keys=len(keys), error=e)
+        finally:
+            for key in keys:
+                self._refreshing.pop(key, None)
+
+    async def _refresh(self, key: Hashable, loader: Callable[[Hashable], Awaitable[Any]]):
+        try:
+            self.set(key, await loader(key))
+        except Exception as e:
+            logs.error("cache_refresh_failed", key=key, error=e)
+        finally:
+            self._refreshing.pop(key, None)
+
+    def set(self, key: Hashable, value: Any):
+        self.entries.set(key, (value, time.monotonic()))
+
+    def entry(self, key: Hashable) -> Optional[tuple]:
+        # The (value, fetched_at) entry itself. Every set() stores a new
+        # tuple, so comparing entries with `is` tells whether the value was
+        # replaced in between.
+        return self.entries.entries.get(key)
+
+    def peek(self, key: Hashable) -> Any:
+        # Cached value without touching LRU order or hit/miss counters
+        entry = self.entries.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "stale": self.stale, "ttl": self.ttl}
@@ -1,137 +1,637 @@
-from appwrite.client import Client
-from appwrite.services.databases import Databases
-from appwrite.query import Query
+import asyncio
 import os
-from dotenv import load_dotenv
-from datetime import datetime, timezone
-
-load_dotenv()
-
-class AppwriteDB:
-    def __init__(self):
-        self.client = Client()
-        self.client.set_endpoint(os.getenv('APPWRITE_ENDPOINT'))
-        self.client.set_project(os.getenv('APPWRITE_PROJECT_ID'))
-        self.client.set_key(os.getenv('APPWRITE_API_KEY'))
-        
-        self.database = Databases(self.client)
-        self.database_id = os.getenv('DATABASE_ID')
-        self.collection_id = os.getenv('COLLECTION_ID')
-
-    async def get_views(self, repo: str) -> int:
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from breaker import CircuitBreaker, CircuitOpenError, DeadlineExceeded
+from cache import CountCache
+from history import History
+from hll import HyperLogLog
+from journal import Journal
+import logs
+from metrics import BACKEND_ERRORS, BACKEND_REJECTED, BACKEND_TIMEOUTS, RATE_LIMITED
+from ratelimit import RateLimiter, visitor_key
+from sharding import ShardRouter
+from storage import StorageBackend
+
+# Deployed instances get their settings from the environment; python-dotenv
+# is only imported for local runs that have a .env file
+if os.path.exists('.env') or os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+class _IncrementBatch:
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.delta = 0
+
+class CounterDB:
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+
+        # Backends are synchronous, so every call runs on this pool instead
+        # of blocking the event loop for a round-trip.
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('DB_POOL_SIZE', '16')),
+            thread_name_prefix='storage'
+        )
+
+        # Every backend call gets a BACKEND_TIMEOUT deadline and goes through
+        # a circuit breaker. While the backend is failing, badges show the
+        # last known count and increments are queued until it recovers.
+        self.backend_timeout = float(os.getenv('BACKEND_TIMEOUT', '2'))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+        )
+
+        # Persisted counts are served from memory for COUNT_CACHE_TTL seconds
+        # and refreshed in the background after that.
+        self.count_cache = CountCache(
+            ttl=float(os.getenv('COUNT_CACHE_TTL', '10')),
+            max_entries=int(os.getenv('COUNT_CACHE_MAX_ENTRIES', '10000'))
+        )
+
+        # Opt-in sharded counters for hot repositories
+        self.shards = ShardRouter(
+            shards=int(os.getenv('SHARD_COUNT', '1')),
+            hot_rate=float(os.getenv('SHARD_HOT_RATE', '20'))
+        )
+
+        # Single-flight state: concurrent reads of a repository share one
+        # in-flight backend read, and increments that arrive while a
+        # write for the same repository is in flight are merged into the
+        # next +N update.
+        self._inflight_reads: Dict[str, asyncio.Future] = {}
+        self._increment_batches: Dict[str, _IncrementBatch] = {}
+        self._increment_writes: Dict[str, asyncio.Task] = {}
+
+        # Rate limiting is decided in memory; visitor records are only
+        # written to the backend, off the request path, when
+        # PERSIST_VISITORS is enabled.
+        self.rate_limiter = RateLimiter(int(os.getenv('RATE_LIMIT_MAX_VISITORS', '100000')))
+        self.persist_visitors = os.getenv('PERSIST_VISITORS', 'false').lower() == 'true'
+        self._background = set()
+
+        # Persisted visitor records only matter within the rate-limit
+        # window; every VISITOR_EXPIRE_INTERVAL seconds, records older than
+        # the longest window seen are listed in pages of VISITOR_EXPIRE_BATCH
+        # and deleted one per backend call.
+        self.visitor_expire_interval = float(os.getenv('VISITOR_EXPIRE_INTERVAL', '300'))
+        self.visitor_expire_batch = int(os.getenv('VISITOR_EXPIRE_BATCH', '100'))
+        self._visitor_window = 0.0
+        self._expire_task = None
+
+        # Opt-in unique visitors: each worker adds visitors to per-repository
+        # HyperLogLog sketches in memory and merges the changed ones into
+        # storage every UNIQUE_FLUSH_INTERVAL seconds. Sketches are reloaded
+        # (and merged with local additions) after UNIQUE_CACHE_TTL seconds.
+        self.unique_visitors = os.getenv('UNIQUE_VISITORS', 'false').lower() == 'true'
+        self.unique_flush_interval = float(os.getenv('UNIQUE_FLUSH_INTERVAL', '30'))
+        self.sketch_cache = CountCache(
+            ttl=float(os.getenv('UNIQUE_CACHE_TTL', '60')),
+            max_entries=int(os.getenv('UNIQUE_MAX_SKETCHES', '1000'))
+        )
+        # Sketches with visitors not yet merged into storage. Held here as
+        # well as in the cache, so an eviction can't lose them.
+        self._dirty_sketches: Dict[str, HyperLogLog] = {}
+        self._sketch_task = None
+
+        # Opt-in view history: every stored increment is also added to a
+        # per-hour delta in memory, and the deltas are written to each
+        # repository's History every HISTORY_FLUSH_INTERVAL seconds
+        self.history = os.getenv('HISTORY', 'false').lower() == 'true'
+        self.history_flush_interval = float(os.getenv('HISTORY_FLUSH_INTERVAL', '30'))
+        self.history_cache = CountCache(
+            ttl=float(os.getenv('HISTORY_CACHE_TTL', '300')),
+            max_entries=int(os.getenv('HISTORY_MAX_ENTRIES', '1000'))
+        )
+        self._history_pending: Dict[str, Dict[int, int]] = {}
+        self._history_task = None
+
+        # Write-behind mode: increments collect in `pending` and are flushed
+        # to the backend every `flush_interval` seconds or once `flush_threshold`
+        # views are waiting, whichever comes first.
+        self.write_behind = os.getenv('WRITE_BEHIND', 'false').lower() == 'true'
+        self.flush_interval = float(os.getenv('WRITE_BEHIND_INTERVAL', '5'))
+        self.flush_threshold = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '100'))
+        self.pending: Dict[str, int] = {}
+        self._pending_total = 0
+        self._flushing: Dict[str, int] = {}
+        self._flush_task = None
+        self._flush_event = None
+        self._flush_lock = None
+        self._sync_task = None
+
+        # With JOURNAL_DIR set, buffered increments are also appended to an
+        # on-disk journal (fsynced every JOURNAL_SYNC_INTERVAL seconds) and
+        # replayed after a restart, so a crash can't drop them
+        self.journal = None
+        self.journal_sync_interval = float(os.getenv('JOURNAL_SYNC_INTERVAL', '0.05'))
+        journal_dir = os.getenv('JOURNAL_DIR')
+        if self.write_behind and journal_dir:
+            self.journal = Journal(journal_dir)
+            for repo, delta in self.journal.replay().items():
+                self.pending[repo] = self.pending.get(repo, 0) + delta
+                self._pending_total += delta
+
+    async def _call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(method, *args, **kwargs))
+
+    async def _call_backend(self, method, *args, **kwargs):
+        if not self.breaker.allow():
+            BACKEND_REJECTED.inc()
+            raise CircuitOpenError("storage backend unavailable")
+        # A timed-out call keeps its pool thread until the backend answers,
+        # but the request stops waiting for it
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        future = loop.run_in_executor(self.executor, partial(method, *args, **kwargs))
         try:
-            result = self.database.list_documents(
-                database_id=self.database_id,
-                collection_id=self.collection_id,
-                queries=[Query.equal('repository', repo)]
-            )
-            if result['total'] == 0:
-                return 0
-            return result['documents'][0]['count']
+            done, _ = await asyncio.wait([future], timeout=self.backend_timeout)
+        except asyncio.CancelledError:
+            # The caller gave up but the call keeps running; its outcome
+            # still has to reach the breaker, or a trial call would leave
+            # the circuit half-open for good
+            future.add_done_callback(self._record_outcome)
+            raise
+        if not done:
+            self.breaker.record_failure()
+            BACKEND_TIMEOUTS.inc()
+            logs.warning("backend_timeout", method=method.__name__, timeout=self.backend_timeout)
+            raise DeadlineExceeded(f"{method.__name__} took longer than {self.backend_timeout}s", future)
+        try:
+            result = future.result()
         except Exception:
-            return 0
+            self.breaker.record_failure()
+            BACKEND_ERRORS.inc()
+            raise
+        self.breaker.record_success()
+        logs.debug("backend_call", method=method.__name__, seconds=round(time.monotonic() - start, 6))
+        return result
+
+    async def _call_maintenance(self, method, *args, **kwargs):
+        # Background upkeep gets the same deadline as request calls but
+        # bypasses the breaker, so slow maintenance never makes badges fail
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, partial(method, *args, **kwargs))
+        done, _ = await asyncio.wait([future], timeout=self.backend_timeout)
+        if not done:
+            BACKEND_TIMEOUTS.inc()
+            raise DeadlineExceeded(f"{method.__name__} took longer than {self.backend_timeout}s", future)
+        return future.result()
 
-    async def increment_views(self, repo: str) -> int:
+    def _record_outcome(self, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def start(self):
+        # Flushes anything replayed from the journal without waiting for
+        # the next view
+        if self.pending:
+            self._start_flusher()
+        if self.persist_visitors:
+            self._expire_task = asyncio.create_task(self._expire_loop())
+        if self.unique_visitors:
+            self._sketch_task = asyncio.create_task(self._sketch_loop())
+        if self.history:
+            self._history_task = asyncio.create_task(self._history_loop())
+
+    def stats(self) -> dict:
+        return {
+            "count_cache": self.count_cache.stats(),
+            "hot_repositories": len(self.shards),
+            "breaker": self.breaker.stats(),
+            "pending_views": self._pending_total
+        }
+
+    async def close(self):
+        if self._expire_task is not None:
+            self._expire_task.cancel()
+        if self._sketch_task is not None:
+            self._sketch_task.cancel()
+        if self._history_task is not None:
+            self._history_task.cancel()
+        # The flusher is only cancelled between flushes; the flush below
+        # writes whatever is still pending
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+        await self.flush()
+        await self.flush_sketches()
+        await self.flush_history()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self.journal is not None:
+            self.journal.close()
+        self.executor.shutdown(wait=True)
+        self.backend.close()
+
+    def _pending_views(self, repo: str) -> int:
+        return self.pending.get(repo, 0) + self._flushing.get(repo, 0)
+
+    async def get_views(self, repo: str) -> Optional[int]:
+        # None when the count is unknown: the backend can't be reached and
+        # nothing is cached, so there is no honest number to show
         try:
-            result = self.database.list_documents(
-                database_id=self.database_id,
-                collection_id=self.collection_id,
-                queries=[Query.equal('repository', repo)]
+            count = await self.count_cache.get(repo, self._load_views)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                logs.error("get_views_failed", repo=repo, error=e)
+            count = self.count_cache.peek(repo)
+            if count is None:
+                return None
+        return count + self._pending_views(repo)
+
+    async def get_views_many(self, repos: List[str]) -> Dict[str, Optional[int]]:
+        # Every uncached repository is read in a single backend call
+        try:
+            counts = await self.count_cache.get_many(repos, self._fetch_views_many)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                logs.error("get_views_failed", repos=len(repos), error=e)
+            counts = {repo: self.count_cache.peek(repo) for repo in repos}
+        return {
+            repo: None if counts.get(repo) is None else counts[repo] + self._pending_views(repo)
+            for repo in repos
+        }
+
+    async def _fetch_views_many(self, repos: list) -> Dict[str, int]:
+        return await self._call_backend(self.backend.fetch_counts, repos)
+
+    def cached_views(self, repo: str) -> Optional[int]:
+        # Last known count without any backend call, even if it is stale
+        count = self.count_cache.peek(repo)
+        if count is None:
+            return None
+        return count + self._pending_views(repo)
+
+    async def _load_views(self, repo: str) -> int:
+        future = self._inflight_reads.get(repo)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_views(repo))
+            self._inflight_reads[repo] = future
+            future.add_done_callback(lambda _: self._inflight_reads.pop(repo, None))
+        return await asyncio.shield(future)
+
+    async def _fetch_views(self, repo: str) -> int:
+        return await self._call_backend(self.backend.fetch_count, repo)
+
+    async def increment_views(self, repo: str) -> Optional[int]:
+        if self.write_behind and (self.journal is None or self.journal.append(repo, 1)):
+            self._queue_views(repo, 1)
+            return await self.get_views(repo)
+
+        try:
+            return await self._add_views_coalesced(repo, 1)
+        except Exception as e:
+            # Degraded mode: the view is queued for the flusher, which
+            # retries it once the backend is back
+            if not isinstance(e, CircuitOpenError):
+                logs.error("increment_views_failed", repo=repo, error=e)
+            self._retry_later(repo, 1, e, self._queue_views)
+            return await self.get_views(repo)
+
+    def _retry_later(self, repo: str, delta: int, error: Exception, requeue):
+        # A write that missed its deadline may still land, so it is only
+        # requeued if it eventually fails; requeueing it right away could
+        # count the views twice
+        if isinstance(error, DeadlineExceeded):
+            def on_done(future):
+                if not future.cancelled() and future.exception() is not None:
+                    requeue(repo, delta)
+            error.future.add_done_callback(on_done)
+        else:
+            requeue(repo, delta)
+
+    def _queue_views(self, repo: str, delta: int):
+        self.pending[repo] = self.pending.get(repo, 0) + delta
+        self._pending_total += delta
+        self._start_flusher()
+        if self._pending_total >= self.flush_threshold:
+            self._flush_event.set()
+
+    async def _add_views_coalesced(self, repo: str, delta: int) -> int:
+        batch = self._increment_batches.get(repo)
+        if batch is None:
+            batch = _IncrementBatch(asyncio.get_running_loop().create_future())
+            self._increment_batches[repo] = batch
+            previous = self._increment_writes.get(repo)
+            self._increment_writes[repo] = asyncio.create_task(
+                self._write_increment_batch(repo, batch, previous)
             )
-            
-            current_time = datetime.now().isoformat()
-            
-            if result['total'] == 0:
-                doc = self.database.create_document(
-                    database_id=self.database_id,
-                    collection_id=self.collection_id,
-                    document_id='unique()',
-                    data={
-                        'repository': repo,
-                        'count': 1,
-                        'last_updated': current_time
-                    }
-                )
-                return 1
-            else:
-                doc = result['documents'][0]
-                new_count = doc['count'] + 1
-                self.database.update_document(
-                    database_id=self.database_id,
-                    collection_id=self.collection_id,
-                    document_id=doc['$id'],
-                    data={
-                        'count': new_count,
-                        'last_updated': current_time
-                    }
-                )
-                return new_count
+        batch.delta += delta
+        position = batch.delta
+
+        # Every caller in the batch gets its own count, as if the
+        # increments had been applied one at a time
+        total = await asyncio.shield(batch.future)
+        return total - batch.delta + position
+
+    async def _write_increment_batch(self, repo: str, batch: _IncrementBatch, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        # Close the batch; later increments start the next one
+        if self._increment_batches.get(repo) is batch:
+            del self._increment_batches[repo]
+        try:
+            batch.future.set_result(await self._add_views(repo, batch.delta))
         except Exception as e:
-            print(f"Error: {e}")
-            return 0
+            batch.future.set_exception(e)
+        finally:
+            if self._increment_writes.get(repo) is asyncio.current_task():
+                del self._increment_writes[repo]
+
+    async def _add_views(self, repo: str, delta: int) -> int:
+        self.shards.record(repo, delta)
+        shard = self.shards.shard_for(repo)
+        before = self.count_cache.entry(repo)
+        count = await self._call_backend(self.backend.add_count, repo, delta, shard)
+        if self.history:
+            self._add_history(repo, delta)
+
+        # Without sharding the backend returns the exact total. With it, the
+        # write returns only one shard's count: even a write to shard 0 may
+        # hit a repository that another worker, or this one before a
+        # restart, spread across shards.
+        if self.shards.shards > 1:
+            return await self._sharded_total(repo, delta, count, before)
+        self.count_cache.set(repo, count)
+        return count
 
-    async def can_increment_view(self, username: str, ip: str, referrer: str, user_agent: str, rate_limit_minutes: int = 60) -> bool:
+    async def _sharded_total(self, repo: str, delta: int, count: int, before) -> int:
+        # The write has landed, so nothing here may raise: the caller would
+        # queue the view again and count it twice
+        entry = self.count_cache.entry(repo)
+        if entry is not None:
+            # The cached total only lacks this delta if it is the entry seen
+            # before the write; a refresh that landed meanwhile may already
+            # include it, so it is only a lower bound. The entry keeps its
+            # age, so once stale it is reloaded with every worker's shards.
+            total = max(count, entry[0] + delta if entry is before else entry[0])
+            self.count_cache.update(repo, total, self._load_views)
+            return total
         try:
-            # Special handling for GitHub camo
-            if "github-camo" in user_agent.lower():
-                visitor_id = f"{username}_github_camo" if username else "anonymous_github_camo"
-            else:
-                # Regular visitor identification
-                visitor_id = f"{ip}_{user_agent}"
-                if username:
-                    visitor_id = f"{username}_{visitor_id}"
-            
-            current_time = datetime.now(timezone.utc)
-            print(f"Debug - Current time (UTC): {current_time}")
-            
-            result = self.database.list_documents(
-                database_id=self.database_id,
-                collection_id=os.getenv('IP_COLLECTION_ID'),
-                queries=[Query.equal('visitor_id', visitor_id)]
+            total = max(count, await self._load_views(repo))
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                logs.error("get_views_failed", repo=repo, error=e)
+            # Only a lower bound: cached as already stale
+            self.count_cache.update(repo, count, self._load_views)
+            return count
+        self.count_cache.set(repo, total)
+        return total
+
+    def _start_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if self.journal is not None and (self._sync_task is None or self._sync_task.done()):
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.journal_sync_interval)
+            try:
+                await self._call(self.journal.sync)
+            except Exception as e:
+                logs.error("journal_sync_failed", error=e)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def flush(self):
+        # Each repository gets a single +N update for all of its pending views
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            # Rotating only opens a segment, so it stays on the event loop:
+            # it must happen together with the swap below, or views added
+            # in between would be journaled in the wrong segment
+            sealed = self.journal.rotate() if self.journal is not None else None
+            self._flushing, self.pending = self.pending, {}
+            self._pending_total = 0
+            if sealed is not None:
+                # The sealed segment reaches the disk before its views are
+                # written
+                await self._call(self.journal.sync)
+            for repo in list(self._flushing):
+                delta = self._flushing[repo]
+                try:
+                    await self._add_views(repo, delta)
+                except Exception as e:
+                    # Keep the delta so the next flush retries it
+                    if not isinstance(e, CircuitOpenError):
+                        logs.error("flush_failed", repo=repo, views=delta, error=e)
+                    self._retry_later(repo, delta, e, self._requeue_flush)
+                del self._flushing[repo]
+            # Everything in the sealed segments is now either stored or
+            # journaled again in the active one
+            if sealed is not None:
+                await self._call(self.journal.discard, sealed)
+
+    def _requeue_flush(self, repo: str, delta: int):
+        # Unlike _queue_views this doesn't wake the flusher, which would
+        # otherwise spin on a backend that is down
+        self.pending[repo] = self.pending.get(repo, 0) + delta
+        self._pending_total += delta
+        if self.journal is not None:
+            self.journal.append(repo, delta)
+
+    async def can_increment_view(
+        self,
+        username: str,
+        ip: str,
+        referrer: str,
+        user_agent: str,
+        rate_limit_minutes: int = 60,
+        repository: Optional[str] = None
+    ) -> bool:
+        # Special handling for GitHub camo
+        camo = "github-camo" in user_agent.lower()
+        if camo:
+            identity = f"{username}_github_camo" if username else "anonymous_github_camo"
+        else:
+            # Regular visitor identification
+            identity = f"{ip}_{user_agent}"
+            if username:
+                identity = f"{username}_{identity}"
+        visitor_id = visitor_key(identity)
+
+        # Repeat visits don't change a sketch, so this happens before and
+        # regardless of rate limiting. Camo proxies every README view
+        # without the viewer's address, so its hits can't tell visitors
+        # apart and stay out of the sketch.
+        if repository is not None and self.unique_visitors and not camo:
+            await self._add_unique_visitor(repository, visitor_id)
+
+        window = rate_limit_minutes * 60
+        self._visitor_window = max(self._visitor_window, window)
+        if not self.rate_limiter.allow(visitor_id, window):
+            RATE_LIMITED.inc()
+            logs.debug("rate_limit", visitor=visitor_id, allowed=False)
+            return False
+
+        logs.debug("rate_limit", visitor=visitor_id, allowed=True)
+        if self.persist_visitors:
+            self._spawn(self._record_visit(visitor_id, username, ip, user_agent, referrer))
+        return True
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _record_visit(self, visitor_id: str, username: str, ip: str, user_agent: str, referrer: str):
+        try:
+            await self._call_backend(
+                self.backend.record_visit,
+                visitor_id=visitor_id,
+                username=username,
+                ip=ip,
+                user_agent=user_agent,
+                referrer=referrer,
+                last_visit=datetime.now(timezone.utc).isoformat()
             )
-            
-            if result['total'] == 0:
-                print(f"Debug - New visitor: {visitor_id}")
-                self.database.create_document(
-                    database_id=self.database_id,
-                    collection_id=os.getenv('IP_COLLECTION_ID'),
-                    document_id='unique()',
-                    data={
-                        'visitor_id': visitor_id,
-                        'ip': ip,
-                        'username': username,
-                        'user_agent': user_agent,
-                        'referrer': referrer,
-                        'last_visit': current_time.isoformat()
-                    }
+        except Exception as e:
+            logs.error("record_visit_failed", error=e)
+
+    async def _expire_loop(self):
+        while True:
+            await asyncio.sleep(self.visitor_expire_interval)
+            await self.expire_visitors()
+
+    async def expire_visitors(self) -> int:
+        # One record per delete call, so every call fits the deadline however
+        # slow deletes are, and requests keep their share of the pool. Runs
+        # only while the breaker is closed, and its failures don't count
+        # against it.
+        before = (datetime.now(timezone.utc) - timedelta(seconds=self._visitor_window)).isoformat()
+        expired = 0
+        while self.breaker.state == "closed":
+            try:
+                visit_ids = await self._call_maintenance(
+                    self.backend.list_expired_visits, before, self.visitor_expire_batch
                 )
-                return True
-            else:
-                last_visit = datetime.fromisoformat(result['documents'][0]['last_visit'])
-                if last_visit.tzinfo is None:
-                    last_visit = last_visit.replace(tzinfo=timezone.utc)
-                
-                time_diff = current_time - last_visit
-                seconds_passed = time_diff.total_seconds()
-                print(f"Debug - Last visit: {last_visit}")
-                print(f"Debug - Time difference in seconds: {seconds_passed}")
-                print(f"Debug - Required seconds: {rate_limit_minutes * 60}")
-                
-                if seconds_passed >= (rate_limit_minutes * 60):
-                    print(f"Debug - Updating last visit for: {visitor_id}")
-                    self.database.update_document(
-                        database_id=self.database_id,
-                        collection_id=os.getenv('IP_COLLECTION_ID'),
-                        document_id=result['documents'][0]['$id'],
-                        data={
-                            'last_visit': current_time.isoformat(),
-                            'referrer': referrer
-                        }
-                    )
-                    return True
-                print(f"Debug - Rate limited: {visitor_id}")
-                return False
-                
+                for visit_id in visit_ids:
+                    await self._call_maintenance(self.backend.delete_visit, visit_id, before)
+                    expired += 1
+            except Exception as e:
+                logs.error("expire_visitors_failed", expired=expired, error=e)
+                break
+            if len(visit_ids) < self.visitor_expire_batch:
+                break
+        return expired
+
+    async def get_unique_views(self, repo: str) -> Optional[int]:
+        try:
+            sketch = await self.sketch_cache.get(repo, self._load_sketch)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                logs.error("get_unique_views_failed", repo=repo, error=e)
+            sketch = self.sketch_cache.peek(repo)
+            if sketch is None:
+                return None
+        return sketch.estimate()
+
+    async def _add_unique_visitor(self, repo: str, visitor_id: str):
+        sketch = self.sketch_cache.peek(repo)
+        if sketch is None and repo in self._dirty_sketches:
+            # Evicted before its flush
+            sketch = self._dirty_sketches[repo]
+            self.sketch_cache.set(repo, sketch)
+        if sketch is None:
+            try:
+                sketch = await self.sketch_cache.get(repo, self._load_sketch)
+            except Exception:
+                # Start from an empty sketch; the next reload merges in
+                # what storage has
+                sketch = HyperLogLog()
+                self.sketch_cache.set(repo, sketch)
+        if sketch.add(bytes.fromhex(visitor_id)):
+            self._dirty_sketches[repo] = sketch
+
+    async def _load_sketch(self, repo: str) -> HyperLogLog:
+        registers = await self._call_backend(self.backend.fetch_sketch, repo)
+        # Keep visitors added locally since the last load
+        sketch = self.sketch_cache.peek(repo) or self._dirty_sketches.get(repo) or HyperLogLog()
+        if registers is not None:
+            sketch.merge(registers)
+        return sketch
+
+    async def _sketch_loop(self):
+        while True:
+            await asyncio.sleep(self.unique_flush_interval)
+            await self.flush_sketches()
+
+    async def flush_sketches(self):
+        dirty, self._dirty_sketches = self._dirty_sketches, {}
+        for repo, sketch in dirty.items():
+            try:
+                sketch.merge(await self._call_backend(self.backend.merge_sketch, repo, bytes(sketch)))
+            except Exception as e:
+                if not isinstance(e, CircuitOpenError):
+                    logs.error("sketch_flush_failed", repo=repo, error=e)
+                # Visitors added meanwhile are usually in the same sketch;
+                # after an eviction and reload they are in a new one
+                pending = self._dirty_sketches.setdefault(repo, sketch)
+                if pending is not sketch:
+                    pending.merge(bytes(sketch))
+
+    def _add_history(self, repo: str, delta: int):
+        hour = int(time.time() // 3600)
+        deltas = self._history_pending.setdefault(repo, {})
+        deltas[hour] = deltas.get(hour, 0) + delta
+
+    async def get_history(self, repo: str, days: int) -> tuple:
+        # Daily views for the last `days` days, oldest first; zeros when
+        # the history can't be loaded or isn't kept (HISTORY off)
+        if not self.history:
+            return (0,) * days
+        try:
+            history = await self.history_cache.get(repo, self._load_history)
         except Exception as e:
-            print(f"Error in can_increment_view: {e}")
-            return False
\ No newline at end of file
+            if not isinstance(e, CircuitOpenError):
+                logs.error("get_history_failed", repo=repo, error=e)
+            history = self.history_cache.peek(repo) or History()
+        return tuple(history.daily(days, int(time.time() // 3600)))
+
+    async def _load_history(self, repo: str) -> History:
+        return History(await self._call_backend(self.backend.fetch_history, repo))
+
+    async def _history_loop(self):
+        while True:
+            await asyncio.sleep(self.history_flush_interval)
+            await self.flush_history()
+
+    async def flush_history(self):
+        pending, self._history_pending = self._history_pending, {}
+        for repo, deltas in pending.items():
+            try:
+                await self._call_backend(self.backend.add_history, repo, deltas)
+            except Exception as e:
+                if not isinstance(e, CircuitOpenError):
+                    logs.error("history_flush_failed", repo=repo, error=e)
+                retry = self._history_pending.setdefault(repo, {})
+                for hour, delta in deltas.items():
+                    retry[hour] = retry.get(hour, 0) + delta
+                continue
+            # Show the flushed views without waiting for the cache to expire
+            cached = self.history_cache.peek(repo)
+            if cached is not None:
+                cached.merge(deltas)
@@ -1,137 +1,82 @@
-from fastapi import FastAPI, Response, Request
-from fastapi.middleware.cors import CORSMiddleware
-from .database import AppwriteDB
-from .badge import generate_badge, THEMES, FONTS
-import asyncio
-from fastapi import Request as FastAPIRequest
+import os
+import sys
 from typing import Any
 
-app = FastAPI(title="GitHub View Counter")
+# Deployed from the repository root (entrypoint
+# functions/github-view-counter/main.py), so the function runs the same
+# modules as the FastAPI app instead of a copy of them
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+from database import CounterDB
+from service import png_badge, svg_badge
+from storage import create_backend
 
-db = AppwriteDB()
+db = CounterDB(create_backend())
+_started = False
 
-@app.get("/")
-async def root():
-    return {
-        "message": "GitHub View Counter API",
-        "usage": "![Views](https://your-domain/badge/username/repo)"
-    }
+# Proxies in front of the runtime that append to x-forwarded-for
+TRUSTED_PROXIES = max(1, int(os.getenv('TRUSTED_PROXIES', '1')))
 
-@app.get("/badge/{username}/{repo}")
-async def get_badge(
-    username: str,
-    repo: str,
-    request: Request,
-    style: str = "flat",
-    theme: str = "default",
-    label: str = "Views",
-    size: str = "normal",
-    font: str = "default",
-    animation: str = "none",
-    reverse: bool = False
-):
-    repository = f"{username}/{repo}"
-    
-    # Get visitor information
-    client_ip = request.client.host
-    user_agent = request.headers.get("user-agent", "")
-    referrer = request.headers.get("referer", "")
-    
-    can_increment = await db.can_increment_view(
-        username=username,
-        ip=client_ip,
-        referrer=referrer,
-        user_agent=user_agent,
-        rate_limit_minutes=15/60
-    )
-    
-    if can_increment:
-        count = await db.increment_views(repository)
-    else:
-        count = await db.get_views(repository)
-    
-    svg = generate_badge(
-        count=count,
-        style=style,
-        theme=theme,
-        label=label,
-        size=size,
-        font=font,
-        animation=animation,
-        reverse=reverse
-    )
-    
-    return Response(
-        content=svg,
-        media_type="image/svg+xml",
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
-    )
+def client_ip(headers: dict) -> str:
+    # Entries left of those the trusted proxies appended are supplied by
+    # the client and can be forged, so the caller is the address the
+    # outermost trusted proxy appended
+    forwarded = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if forwarded:
+        return forwarded[-min(TRUSTED_PROXIES, len(forwarded))]
+    return headers.get("x-real-ip", "") or "unknown"
+
+def query_bool(value: str, default: bool) -> bool:
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+def query_int(value: str, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
 
 async def main(context: Any) -> Any:
-    request = FastAPIRequest(scope={
-        'type': 'http',
-        'method': context.req.method,
-        'path': context.req.path,
-        'query_string': context.req.query_string.encode(),
-        'headers': [[k.lower().encode(), v.encode()] for k, v in context.req.headers.items()],
-        'client': ('127.0.0.1', 0),
-    })
-    
+    global _started
+    if not _started:
+        _started = True
+        await db.start()
+
     path_parts = context.req.path.strip('/').split('/')
     if len(path_parts) < 2:
-        return {
-            "body": {
-                "message": "GitHub View Counter API",
-                "usage": "![Views](https://your-domain/badge/username/repo)"
-            },
-            "statusCode": 200
-        }
-    
+        return context.res.json({
+            "message": "GitHub View Counter API",
+            "usage": "![Views](https://your-domain/badge/username/repo)"
+        })
+
     username, repo = path_parts[-2:]
-    
-    query_params = context.req.query
-    style = query_params.get('style', 'flat')
-    theme = query_params.get('theme', 'default')
-    label = query_params.get('label', 'Views')
-    size = query_params.get('size', 'normal')
-    font = query_params.get('font', 'default')
-    animation = query_params.get('animation', 'none')
-    reverse = query_params.get('reverse', 'false').lower() == 'true'
-    
-    response = await get_badge(
-        username=username,
-        repo=repo,
-        request=request,
-        style=style,
-        theme=theme,
-        label=label,
-        size=size,
-        font=font,
-        animation=animation,
-        reverse=reverse
+    headers = {name.lower(): value for name, value in context.req.headers.items()}
+    query = context.req.query
+    options = dict(
+        style=query.get('style', 'flat'),
+        theme=query.get('theme', 'default'),
+        label=query.get('label', 'Views'),
+        size=query.get('size', 'normal'),
+        font=query.get('font', 'default'),
+        reverse=query_bool(query.get('reverse'), False),
+        metric=query.get('metric', 'views'),
+        days=query_int(query.get('days'), 14)
     )
-    
-    return {
-        "body": response.body,
-        "statusCode": 200,
-        "headers": {
-            "Content-Type": response.media_type,
-            **response.headers
-        }
-    }
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
- 
\ No newline at end of file
+    if repo.endswith('.png'):
+        status, response_headers, body = await png_badge(db, username, repo[:-4], client_ip(headers), headers, **options)
+    else:
+        status, response_headers, body = await svg_badge(
+            db,
+            username,
+            repo,
+            client_ip(headers),
+            headers,
+            animation=query.get('animation', 'none'),
+            compact=query_bool(query.get('compact'), True),
+            **options
+        )
+    return context.res.binary(body, status, response_headers)
@@ -0,0 +1,68 @@
+import os
+import struct
+from array import array
+from typing import Dict, List, Optional
+
+# Hourly buckets cover the last HOURS hours, daily buckets the last
+# HISTORY_DAYS days; older traffic is dropped as the rings wrap
+HOURS = 48
+DAYS = int(os.getenv('HISTORY_DAYS', '30'))
+
+_HEADER = struct.Struct('<qHH')
+
+
+class History:
+    # Per-repository view history in two rings of 32-bit counters. Every
+    # write adds to its hour and to its day, so the daily rollup is kept up
+    # to date on the write path and reads never sum hours.
+    def __init__(self, data: Optional[bytes] = None):
+        if data is None:
+            self.hour = 0
+            self.hours = array('I', bytes(4 * HOURS))
+            self.days = array('I', bytes(4 * DAYS))
+            return
+        self.hour, hours, days = _HEADER.unpack_from(data)
+        self.hours = array('I', data[_HEADER.size:_HEADER.size + 4 * hours])
+        self.days = array('I', data[_HEADER.size + 4 * hours:_HEADER.size + 4 * (hours + days)])
+
+    def _advance(self, hour: int):
+        # Zeroes the buckets the rings wrap over between the last write and
+        # `hour`; at most one full pass of each ring
+        if hour <= self.hour:
+            return
+        for h in range(max(self.hour + 1, hour - len(self.hours) + 1), hour + 1):
+            self.hours[h % len(self.hours)] = 0
+        last_day, day = self.hour // 24, hour // 24
+        for d in range(max(last_day + 1, day - len(self.days) + 1), day + 1):
+            self.days[d % len(self.days)] = 0
+        self.hour = hour
+
+    def add(self, delta: int, hour: int):
+        # `hour` is hours since the epoch. Writes older than the rings are
+        # dropped; late writes within them land in their own bucket.
+        self._advance(hour)
+        if hour > self.hour - len(self.hours):
+            self.hours[hour % len(self.hours)] += delta
+        day = hour // 24
+        if day > self.hour // 24 - len(self.days):
+            self.days[day % len(self.days)] += delta
+
+    def merge(self, deltas: Dict[int, int]):
+        for hour in sorted(deltas):
+            self.add(deltas[hour], hour)
+
+    def daily(self, days: int, hour: int) -> List[int]:
+        # Views per day for the `days` days up to and including `hour`'s
+        # day, oldest first
+        today = hour // 24
+        last_day = self.hour // 24
+        counts = []
+        for day in range(today - days + 1, today + 1):
+            if day > last_day or day <= last_day - len(self.days) or day < 0:
+                counts.append(0)
+            else:
+                counts.append(self.days[day % len(self.days)])
+        return counts
+
+    def __bytes__(self) -> bytes:
+        return _HEADER.pack(self.hour, len(self.hours), len(self.days)) + self.hours.tobytes() + self.days.tobytes()
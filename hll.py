@@ -0,0 +1,58 @@
+import math
+from typing import Optional
+
+# 2**12 one-byte registers: a 4 KiB sketch with ~1.6% standard error,
+# however many visitors it has seen
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_REST_BITS = 64 - PRECISION
+_REST_MASK = (1 << _REST_BITS) - 1
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+class HyperLogLog:
+    # Cardinality sketch. Adding the same item twice is a no-op and merging
+    # is a register-wise max, so sketches from any number of workers can be
+    # merged in any order, repeatedly, without double counting.
+    def __init__(self, registers: Optional[bytes] = None):
+        if registers is not None and len(registers) != REGISTERS:
+            raise ValueError(f"expected {REGISTERS} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(REGISTERS)
+        self._estimate: Optional[int] = None
+
+    def add(self, digest: bytes) -> bool:
+        # `digest` is a uniformly distributed hash of the item, at least 8
+        # bytes; returns whether the sketch changed
+        value = int.from_bytes(digest[:8], 'big')
+        index = value >> _REST_BITS
+        rank = _REST_BITS - (value & _REST_MASK).bit_length() + 1
+        if rank <= self.registers[index]:
+            return False
+        self.registers[index] = rank
+        self._estimate = None
+        return True
+
+    def merge(self, registers: bytes) -> bool:
+        if len(registers) != REGISTERS:
+            raise ValueError(f"expected {REGISTERS} registers, got {len(registers)}")
+        merged = bytearray(map(max, self.registers, registers))
+        if merged == self.registers:
+            return False
+        self.registers = merged
+        self._estimate = None
+        return True
+
+    def estimate(self) -> int:
+        if self._estimate is None:
+            registers = self.registers
+            raw = _ALPHA * REGISTERS * REGISTERS / sum(2.0 ** -rank for rank in registers)
+            zeros = registers.count(0)
+            if raw <= 2.5 * REGISTERS and zeros:
+                # Linear counting is more accurate while many registers
+                # are still empty
+                raw = REGISTERS * math.log(REGISTERS / zeros)
+            self._estimate = round(raw)
+        return self._estimate
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.registers)
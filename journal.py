@@ -0,0 +1,181 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# One fixed-size record per buffered increment: repository digest, delta,
+# the repository name (needed to replay it) and a CRC32 of the rest, so a
+# record torn by a crash is detected and skipped
+RECORD = struct.Struct('<16sqH226sI')
+MAX_NAME_BYTES = 226
+
+
+class Journal:
+    # Append-only log of increments that are buffered in memory but not yet
+    # written to the backend. Records go to the active segment file; a flush
+    # rotates to a new segment and deletes the sealed ones once their deltas
+    # are stored. fsync is batched: sync() is called periodically rather
+    # than once per record, off the event loop, and never while holding the
+    # lock that append() takes.
+    #
+    # Several processes (uvicorn --workers) can share one root directory.
+    # Each writes to its own worker-* subdirectory and holds an flock on
+    # it for its lifetime, so a directory whose lock is free belongs to a
+    # process that has exited: replay() adopts only those.
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # Locked under a hidden name first, so no other process can adopt
+        # the directory between its creation and the lock
+        staging = tempfile.mkdtemp(prefix=".new-", dir=root)
+        self._lock_fd = self._try_lock(staging)
+        self.directory = os.path.join(root, "worker-" + os.path.basename(staging)[5:])
+        os.rename(staging, self.directory)
+        # (directory, lock fd) of exited processes' journals replayed here,
+        # removed by the first discard() once their deltas are stored
+        self._adopted: List[Tuple[str, int]] = []
+        self._lock = threading.Lock()
+        self._dirty = False
+        # Sealed segments whose data sync() hasn't flushed to disk yet
+        self._sealed_fds: list = []
+        self._number = 1
+        self._fd = self._open(self._number)
+
+    @staticmethod
+    def _try_lock(directory: str) -> Optional[int]:
+        fd = os.open(os.path.join(directory, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _path(self, number: int, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self.directory, f"segment-{number:08d}.log")
+
+    def _segments(self, directory: Optional[str] = None) -> list:
+        numbers = []
+        for name in os.listdir(directory or self.directory):
+            if name.startswith("segment-") and name.endswith(".log"):
+                numbers.append(int(name[8:-4]))
+        return sorted(numbers)
+
+    def _open(self, number: int) -> int:
+        return os.open(self._path(number), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def replay(self) -> Dict[str, int]:
+        # Sums the deltas journaled by processes that have exited. Their
+        # directories stay locked by this process, and on disk until the
+        # next successful flush discards them; live processes' journals are
+        # left alone.
+        pending: Dict[str, int] = {}
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if not name.startswith("worker-") or directory == self.directory:
+                continue
+            try:
+                lock_fd = self._try_lock(directory)
+            except FileNotFoundError:
+                # Retired by another process meanwhile
+                continue
+            if lock_fd is None:
+                continue
+            if not os.path.isdir(directory):
+                os.close(lock_fd)
+                continue
+            self._adopted.append((directory, lock_fd))
+            for number in self._segments(directory):
+                with open(self._path(number, directory), 'rb') as segment:
+                    data = segment.read()
+                for offset in range(0, len(data) - RECORD.size + 1, RECORD.size):
+                    record = data[offset:offset + RECORD.size]
+                    digest, delta, length, name, crc = RECORD.unpack(record)
+                    if zlib.crc32(record[:-4]) != crc:
+                        continue
+                    repo = name[:length].decode('utf-8')
+                    pending[repo] = pending.get(repo, 0) + delta
+        return pending
+
+    def append(self, repo: str, delta: int) -> bool:
+        name = repo.encode('utf-8')
+        if len(name) > MAX_NAME_BYTES:
+            return False
+        digest = hashlib.blake2b(name, digest_size=16).digest()
+        body = RECORD.pack(digest, delta, len(name), name, 0)[:-4]
+        with self._lock:
+            os.write(self._fd, body + struct.pack('<I', zlib.crc32(body)))
+            self._dirty = True
+        return True
+
+    def sync(self):
+        # The active segment is fsynced through a duplicate fd, so rotate()
+        # can close the original meanwhile
+        with self._lock:
+            sealed, self._sealed_fds = self._sealed_fds, []
+            active = os.dup(self._fd) if self._dirty else None
+            self._dirty = False
+        try:
+            for fd in sealed:
+                os.fsync(fd)
+            if active is not None:
+                os.fsync(active)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+        finally:
+            for fd in sealed:
+                os.close(fd)
+            if active is not None:
+                os.close(active)
+
+    def rotate(self) -> int:
+        # Seals the active segment and returns its number; every segment up
+        # to it holds only deltas that are part of the flush in progress.
+        # Only opens the next segment: the sealed one is fsynced by the next
+        # sync().
+        with self._lock:
+            if self._dirty:
+                self._sealed_fds.append(self._fd)
+            else:
+                os.close(self._fd)
+            sealed = self._number
+            self._number += 1
+            self._fd = self._open(self._number)
+            self._dirty = False
+        return sealed
+
+    def discard(self, sealed: int):
+        for number in self._segments():
+            if number <= sealed:
+                os.remove(self._path(number))
+        adopted, self._adopted = self._adopted, []
+        for directory, lock_fd in adopted:
+            self._retire(directory, lock_fd)
+
+    def _retire(self, directory: str, lock_fd: int):
+        # Renamed first, so a crash while deleting can't leave segments
+        # that a later process would replay again
+        hidden = os.path.join(self.root, ".done-" + os.path.basename(directory))
+        os.rename(directory, hidden)
+        shutil.rmtree(hidden, ignore_errors=True)
+        os.close(lock_fd)
+
+    def close(self):
+        with self._lock:
+            for fd in self._sealed_fds + [self._fd]:
+                os.fsync(fd)
+                os.close(fd)
+            self._sealed_fds = []
+            # With nothing left to replay the directory goes too; otherwise
+            # releasing the lock hands it to the next process that starts
+            if all(os.path.getsize(self._path(number)) == 0 for number in self._segments()):
+                self._retire(self.directory, self._lock_fd)
+            else:
+                os.close(self._lock_fd)
@@ -0,0 +1,117 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from typing import Optional, Tuple
+
+from metrics import Counter
+
+# Structured logging off the request path. Events are JSON lines built and
+# written by a listener thread; the caller only puts a record on a bounded
+# queue, and records are dropped (and counted) rather than blocking when the
+# writer falls behind.
+#
+# Every event carries the correlation ID of the request it belongs to, so
+# the rate-limit decision, backend calls and render of one badge can be
+# grouped. Debug events are sampled per request: a sampled request logs all
+# of its debug events, the others log none.
+
+LOG_LEVEL = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE', '1'))
+QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+DROPPED = Counter("badge_log_dropped_total", "Log events dropped because the log queue was full")
+
+# (request id, debug events sampled) of the current request
+_request: ContextVar[Optional[Tuple[str, bool]]] = ContextVar("request", default=None)
+
+_debug = LOG_LEVEL <= logging.DEBUG and DEBUG_SAMPLE_RATE > 0
+
+# Generated IDs are a random per-process prefix and a sequence number:
+# unique across workers and cheaper than random IDs per request
+_id_prefix = os.urandom(4).hex()
+_id_sequence = itertools.count(1)
+
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.msg,
+            "request_id": record.request_id
+        }
+        entry.update(record.fields)
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            DROPPED.inc()
+
+
+_logger = logging.getLogger("badge")
+_logger.setLevel(LOG_LEVEL)
+_logger.propagate = False
+
+_queue: Queue = Queue(QUEUE_SIZE)
+_logger.addHandler(_DroppingQueueHandler(_queue))
+_output = logging.StreamHandler(sys.stdout)
+_output.setFormatter(_JSONFormatter())
+_listener = QueueListener(_queue, _output)
+_listener.start()
+# Write out what is still queued on exit
+atexit.register(_listener.stop)
+
+
+def _sample() -> bool:
+    return DEBUG_SAMPLE_RATE >= 1 or random.random() < DEBUG_SAMPLE_RATE
+
+
+def start_request(request_id: Optional[str] = None) -> str:
+    # Starts a new correlation context for the current task. An incoming
+    # X-Request-ID is reused so IDs can be followed across services.
+    request_id = request_id[:64] if request_id else f"{_id_prefix}-{next(_id_sequence):x}"
+    _request.set((request_id, _debug and _sample()))
+    return request_id
+
+
+def _log(level: int, event: str, fields: dict, request: Optional[Tuple[str, bool]]):
+    _logger.log(level, event, extra={"request_id": request[0] if request else "-", "fields": fields})
+
+
+def debug(event: str, **fields):
+    if not _debug:
+        return
+    request = _request.get()
+    # Outside a request (background loops) each event is sampled alone
+    if request[1] if request is not None else _sample():
+        _log(logging.DEBUG, event, fields, request)
+
+
+def info(event: str, **fields):
+    if LOG_LEVEL <= logging.INFO:
+        _log(logging.INFO, event, fields, _request.get())
+
+
+def warning(event: str, **fields):
+    if LOG_LEVEL <= logging.WARNING:
+        _log(logging.WARNING, event, fields, _request.get())
+
+
+def error(event: str, **fields):
+    _log(logging.ERROR, event, fields, _request.get())
@@ -1,7 +1,15 @@
+import hashlib
+import os
 from fastapi import FastAPI, Response, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import AppwriteDB
-from badge import generate_badge, THEMES, FONTS
+from database import CounterDB
+from storage import create_backend
+from badge import badge_cache, badge_key, badge_svg, stack_badges
+from raster import load_fonts, png_cache
+import logs
+import metrics
+from service import etag_matches, png_badge, svg_badge
 
 app = FastAPI(title="GitHub View Counter")
 
@@ -12,7 +20,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-db = AppwriteDB()
+db = CounterDB(create_backend())
+
+BATCH_MAX_REPOS = int(os.getenv('BATCH_MAX_REPOS', '100'))
+
+# Cache and buffer state is read when /metrics is scraped rather than
+# recorded per request
+for cache_name, cache in (("count", db.count_cache.entries), ("badge", badge_cache), ("png", png_cache)):
+    metrics.Collected("badge_cache_hits_total", "Cache hits", lambda cache=cache: cache.hits, "counter", {"cache": cache_name})
+    metrics.Collected("badge_cache_misses_total", "Cache misses", lambda cache=cache: cache.misses, "counter", {"cache": cache_name})
+metrics.Collected("badge_count_cache_stale_total", "Stale counts served while refreshing", lambda: db.count_cache.stale, "counter")
+metrics.Collected("badge_pending_views", "Views buffered for the backend", lambda: db._pending_total)
+metrics.Collected("badge_backend_circuit_open", "1 while the storage circuit breaker is open", lambda: int(db.breaker.state != "closed"))
+
+# Profiling is off unless PROFILE_DIR and a token or sample rate are set;
+# then selected requests run under the profiler and /profile captures a
+# time window. Otherwise neither the middleware nor the route exists.
+if os.getenv('PROFILE_DIR'):
+    import profiling
+
+    if profiling.enabled():
+        app.add_middleware(profiling.ProfilingMiddleware)
+
+        @app.get("/profile")
+        async def profile(request: Request, seconds: float = 10):
+            if not profiling.token_matches(request.headers.get("x-profile-token")):
+                return JSONResponse({"error": "invalid profile token"}, status_code=403)
+            result = await profiling.profile_for(seconds)
+            if result is None:
+                return JSONResponse({"error": "a profile is already running"}, status_code=409)
+            return result
+
+@app.on_event("startup")
+async def startup():
+    load_fonts()
+    await db.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await db.close()
 
 @app.get("/")
 async def root():
@@ -21,6 +67,46 @@ async def root():
         "usage": "![Views](https://your-domain/badge/username/repo)"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    return {**db.stats(), "badge_cache": badge_cache.stats(), "png_cache": png_cache.stats()}
+
+# Declared before the SVG route, which would otherwise match "repo.png"
+@app.get("/badge/{username}/{repo}.png")
+async def get_badge_png(
+    username: str,
+    repo: str,
+    request: Request,
+    style: str = "flat",
+    theme: str = "default",
+    label: str = "Views",
+    size: str = "normal",
+    font: str = "default",
+    reverse: bool = False,
+    metric: str = "views",
+    days: int = 14
+):
+    status, headers, body = await png_badge(
+        db,
+        username,
+        repo,
+        request.client.host,
+        request.headers,
+        style=style,
+        theme=theme,
+        label=label,
+        size=size,
+        font=font,
+        reverse=reverse,
+        metric=metric,
+        days=days
+    )
+    return Response(content=body, status_code=status, headers=headers)
+
 @app.get("/badge/{username}/{repo}")
 async def get_badge(
     username: str,
@@ -32,48 +118,66 @@ async def get_badge(
     size: str = "normal",
     font: str = "default",
     animation: str = "none",
-    reverse: bool = False
+    reverse: bool = False,
+    compact: bool = True,
+    metric: str = "views",
+    days: int = 14
 ):
-    repository = f"{username}/{repo}"
-    
-    # Get visitor information
-    client_ip = request.client.host
-    user_agent = request.headers.get("user-agent", "")
-    referrer = request.headers.get("referer", "")
-    
-    can_increment = await db.can_increment_view(
-        username=username,
-        ip=client_ip,
-        referrer=referrer,
-        user_agent=user_agent,
-        rate_limit_minutes=15/60
-    )
-    
-    if can_increment:
-        count = await db.increment_views(repository)
-    else:
-        count = await db.get_views(repository)
-    
-    svg = generate_badge(
-        count=count,
+    status, headers, body = await svg_badge(
+        db,
+        username,
+        repo,
+        request.client.host,
+        request.headers,
         style=style,
         theme=theme,
         label=label,
         size=size,
         font=font,
         animation=animation,
-        reverse=reverse
-    )
-    
-    return Response(
-        content=svg,
-        media_type="image/svg+xml",
-        headers={
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
+        reverse=reverse,
+        compact=compact,
+        metric=metric,
+        days=days
     )
+    return Response(content=body, status_code=status, headers=headers)
+
+@app.get("/batch")
+async def get_batch(
+    request: Request,
+    repos: str,
+    format: str = "json",
+    style: str = "flat",
+    theme: str = "default",
+    size: str = "normal",
+    font: str = "default",
+    compact: bool = True
+):
+    # Counts for a comma-separated list of owner/repo names, read with one
+    # backend query. Only displays counts: hits here aren't counted.
+    names = list(dict.fromkeys(name.strip() for name in repos.split(",") if name.strip()))
+    if not names:
+        return JSONResponse({"error": "repos is empty"}, status_code=400)
+    if len(names) > BATCH_MAX_REPOS:
+        return JSONResponse({"error": f"at most {BATCH_MAX_REPOS} repos per request"}, status_code=400)
+
+    logs.start_request(request.headers.get("x-request-id"))
+    counts = await db.get_views_many(names)
+    if format != "svg":
+        return {"counts": counts}
+
+    svg = stack_badges([
+        badge_svg(badge_key(count=counts[name], style=style, theme=theme, label=name, size=size, font=font, compact=compact))
+        for name in names
+    ])
+    etag = '"' + hashlib.blake2b(svg.encode(), digest_size=12).hexdigest() + '"'
+    headers = {
+        "Cache-Control": "no-cache, must-revalidate",
+        "ETag": etag
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=svg, media_type="image/svg+xml", headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
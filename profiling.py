@@ -0,0 +1,157 @@
+import asyncio
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+import logs
+
+# Opt-in statistical profiler. A sampler thread records the stacks of the
+# event loop thread and the storage pool threads every PROFILE_INTERVAL
+# seconds and writes them in the collapsed format read by flamegraph.pl,
+# speedscope and similar tools: one "frame;frame;frame count" line per
+# distinct stack. Each stack starts with its thread's name, so time in the
+# storage backend, in badge rendering and in sync calls stalling the event
+# loop show up as separate towers.
+#
+# Samples are taken while the loop thread holds the GIL only at switch
+# points (sys.getswitchinterval(), 5ms by default), so a loop busy with
+# Python code is sampled at most that often.
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', '')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.001'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+
+_file_sequence = itertools.count(1)
+
+
+def enabled() -> bool:
+    return bool(PROFILE_DIR) and (bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0)
+
+
+def token_matches(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    def __init__(self, interval: float = PROFILE_INTERVAL, thread_prefix: str = "storage"):
+        self.interval = interval
+        self.thread_prefix = thread_prefix
+        # The thread that starts the sampler runs the event loop
+        self.loop_thread = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, "")
+                if ident != self.loop_thread and not name.startswith(self.thread_prefix):
+                    continue
+                # Idle pool threads wait in _worker for the next call
+                if frame.f_code.co_name == "_worker":
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+def write_profile(stacks: Counter, label: str, directory: str = PROFILE_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    slug = "".join(c if c.isalnum() else "_" for c in label).strip("_")[:80] or "profile"
+    path = os.path.join(
+        directory,
+        f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_file_sequence)}-{slug}.folded"
+    )
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+# Only one profile runs at a time; requests selected while one is running
+# are served unprofiled (their samples land in the running profile anyway)
+_active: Optional[Sampler] = None
+
+
+async def profile_for(seconds: float, label: str = "window") -> Optional[dict]:
+    # Profiles everything the process does for a time window
+    global _active
+    if _active is not None:
+        return None
+    sampler = _active = Sampler().start()
+    try:
+        await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+    finally:
+        stacks = sampler.stop()
+        _active = None
+    path = await asyncio.get_running_loop().run_in_executor(None, write_profile, stacks, label)
+    logs.info("profile_written", file=path, samples=sampler.samples)
+    return {"file": path, "samples": sampler.samples}
+
+
+class ProfilingMiddleware:
+    # Plain ASGI middleware, added only when profiling is configured, so
+    # the app has no profiling code on its request path otherwise
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    def _selected(self, scope) -> bool:
+        # /profile runs its own sampler
+        if scope["path"] == "/profile":
+            return False
+        if PROFILE_TOKEN:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    return token_matches(value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        global _active
+        if scope["type"] != "http" or _active is not None or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = _active = Sampler().start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stacks = sampler.stop()
+            _active = None
+        # Requests faster than the sampling interval leave no samples
+        if not stacks:
+            return
+        label = f"{scope['method']} {scope['path']}"
+        try:
+            path = await asyncio.get_running_loop().run_in_executor(None, write_profile, stacks, label)
+        except OSError as e:
+            logs.error("profile_write_failed", error=e)
+            return
+        logs.info("profile_written", file=path, samples=sampler.samples)
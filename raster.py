@@ -0,0 +1,147 @@
+import hashlib
+import io
+import os
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from badge import GRADIENTS, SIZES, SPARKLINE_WIDTH, THEMES, FONTS, badge_layout, sparkline_points
+from cache import LRUCache
+
+# PNGs are drawn at SCALE times the SVG size so they stay sharp on
+# high-density screens
+SCALE = int(os.getenv('PNG_SCALE', '2'))
+
+# TrueType files tried for each badge font, first match wins. The SVG
+# font stacks rely on the viewer's fonts; here we need files on disk.
+FONT_FILES = {
+    "default": ["segoeui.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf"],
+    "mono": ["consola.ttf", "DejaVuSansMono.ttf", "LiberationMono-Regular.ttf"],
+    "serif": ["times.ttf", "DejaVuSerif.ttf", "LiberationSerif-Regular.ttf"],
+    "comic": ["comic.ttf", "DejaVuSans.ttf"],
+    "fira": ["FiraCode-Regular.ttf", "DejaVuSansMono.ttf"],
+    "roboto": ["Roboto-Regular.ttf", "DejaVuSans.ttf"]
+}
+
+# Rasterized badges are content-addressed by a digest of the badge key,
+# so each distinct (params, count_str) is drawn once per process
+png_cache = LRUCache(int(os.getenv('PNG_CACHE_SIZE', '1024')))
+
+_fonts = {}
+
+def load_fonts():
+    for font in FONTS:
+        for dims in SIZES.values():
+            _get_font(font, dims["font_size"] * SCALE)
+
+def _get_font(font: str, pixel_size: int):
+    key = (font, pixel_size)
+    loaded = _fonts.get(key)
+    if loaded is None:
+        for filename in FONT_FILES.get(font, FONT_FILES["default"]):
+            try:
+                loaded = ImageFont.truetype(filename, pixel_size)
+                break
+            except OSError:
+                continue
+        else:
+            try:
+                loaded = ImageFont.load_default(pixel_size)
+            except TypeError:
+                # Pillow < 10.1 only ships the fixed-size bitmap font
+                loaded = ImageFont.load_default()
+        _fonts[key] = loaded
+    return loaded
+
+def png_digest(key: tuple) -> str:
+    return hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+
+def badge_png(key: tuple) -> bytes:
+    digest = png_digest(key)
+    png = png_cache.get(digest)
+    if png is None:
+        png = _render_png(*key)
+        png_cache.set(digest, png)
+    return png
+
+def _fill(image: Image.Image, box: tuple, color: str):
+    x0, y0, x1, y1 = box
+    draw = ImageDraw.Draw(image)
+    if not color.startswith("url(#"):
+        draw.rectangle([x0, y0, x1 - 1, y1 - 1], fill=color)
+        return
+
+    stops = [(float(offset.rstrip("%")) / 100, ImageColor.getrgb(stop)) for offset, stop in GRADIENTS[color[5:-1]]]
+    width = max(x1 - x0, 1)
+    for x in range(x0, x1):
+        draw.line([(x, y0), (x, y1 - 1)], fill=_gradient_color(stops, (x - x0) / width))
+
+def _gradient_color(stops: list, position: float) -> tuple:
+    for (start, start_rgb), (end, end_rgb) in zip(stops, stops[1:]):
+        if position <= end:
+            t = (position - start) / (end - start) if end > start else 0
+            return tuple(round(a + (b - a) * t) for a, b in zip(start_rgb, end_rgb))
+    return stops[-1][1]
+
+def _render_png(
+    style: str,
+    theme: str,
+    label: str,
+    size: str,
+    font: str,
+    animation: str,
+    reverse: bool,
+    compact: bool,
+    count_str: str,
+    history: tuple = ()
+) -> bytes:
+    # Same geometry as the SVG; animations have no PNG equivalent
+    style, theme, size, reverse, first_text, second_text, first_width, second_width = badge_layout(
+        style, theme, label, size, reverse, count_str
+    )
+    colors = THEMES[theme]
+    height = SIZES[size]["height"] * SCALE
+    first_width *= SCALE
+    second_width *= SCALE
+    total_width = first_width + second_width
+    chart_width = SPARKLINE_WIDTH * SCALE if style == "sparkline" else 0
+
+    image = Image.new("RGBA", (total_width + chart_width, height), (0, 0, 0, 0))
+    _fill(image, (0, 0, first_width, height), colors["count"] if reverse else colors["bg"])
+    _fill(image, (first_width, 0, total_width, height), colors["bg"] if reverse else colors["count"])
+    if chart_width:
+        _fill(image, (total_width, 0, total_width + chart_width, height), colors["bg"])
+        points = [(x * SCALE, y * SCALE) for x, y in sparkline_points(history, total_width / SCALE, SPARKLINE_WIDTH, height / SCALE)]
+        ImageDraw.Draw(image).line(points, fill=colors["text"], width=max(1, round(1.5 * SCALE)), joint="curve")
+    total_width += chart_width
+
+    if style == "plastic":
+        # Glossy top, darker bottom, like the SVG's highlight gradient
+        overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+        for y in range(height):
+            position = y / height
+            if position < 0.1:
+                color = (255, 255, 255, round(178 - 1520 * position))
+            else:
+                color = (0, 0, 0, round(25 + 60 * (position - 0.1)))
+            draw.line([(0, y), (total_width - 1, y)], fill=color)
+        image = Image.alpha_composite(image, overlay)
+
+    radius = {"flat": 3, "sparkline": 3, "plastic": 4}.get(style, 0) * SCALE
+    if radius:
+        mask = Image.new("L", image.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle([0, 0, total_width - 1, height - 1], radius=radius, fill=255)
+        image.putalpha(mask)
+
+    draw = ImageDraw.Draw(image, "RGBA")
+    text_color = ImageColor.getrgb(colors["text"])[:3]
+    text_font = _get_font(font if font in FONTS else "default", SIZES[size]["font_size"] * SCALE)
+    for text, center in ((first_text, first_width / 2), (second_text, first_width + second_width / 2)):
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=text_font)
+        x = center - (right - left) / 2 - left
+        y = (height - (bottom - top)) / 2 - top
+        if style == "flat":
+            draw.text((x, y + height * 0.05), text, font=text_font, fill=text_color + (77,))
+        draw.text((x, y), text, font=text_font, fill=text_color)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
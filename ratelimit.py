@@ -0,0 +1,44 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def visitor_key(identity: str) -> str:
+    # Fixed-size key for a visitor identity (username, IP, user agent):
+    # a 16-byte digest, so stored keys and their index stay small no
+    # matter how long the user agent is
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+
+class RateLimiter:
+    # Remembers the last counted visit per visitor. Entries are kept in the
+    # order they were last counted, so expired visitors always sit at the
+    # front and both expiry and LRU eviction are O(1) pops.
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.visits: "OrderedDict[str, float]" = OrderedDict()
+
+    def allow(self, key: str, window_seconds: float, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+
+        last_visit = self.visits.get(key)
+        if last_visit is not None and now - last_visit < window_seconds:
+            return False
+
+        self.visits[key] = now
+        self.visits.move_to_end(key)
+        self._evict(now, window_seconds)
+        return True
+
+    def _evict(self, now: float, window_seconds: float):
+        visits = self.visits
+        while visits:
+            key, last_visit = next(iter(visits.items()))
+            if now - last_visit < window_seconds and len(visits) <= self.max_entries:
+                break
+            visits.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.visits)
@@ -0,0 +1,213 @@
+from time import perf_counter
+from typing import Dict, Mapping, Optional, Tuple
+from badge import badge_bytes, badge_etag, badge_key, supported_encodings
+from bots import is_bot
+from database import CounterDB
+from history import DAYS as HISTORY_DAYS
+import logs
+from metrics import (
+    BOT_HITS, GET_VIEWS_SECONDS, INCREMENT_VIEWS_SECONDS, RATE_LIMIT_SECONDS, RENDER_SECONDS, REQUEST_SECONDS
+)
+
+# The badge pipeline (bot check, rate limit, count, render, conditional
+# response) shared by the FastAPI app and the Appwrite Function. It takes
+# plain values and returns (status, headers, body), so neither entry point
+# needs the other's request objects.
+
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-cache, must-revalidate",
+    "Pragma": "no-cache",
+    "Expires": "0"
+}
+
+async def count_view(
+    db: CounterDB,
+    username: str,
+    repo: str,
+    client_ip: str,
+    user_agent: str,
+    referrer: str,
+    metric: str = "views"
+) -> Optional[int]:
+    # Counts the hit and returns the number the badge shows: total views,
+    # or with metric=unique the estimated number of distinct visitors
+    repository = f"{username}/{repo}"
+    unique = metric == "unique" and db.unique_visitors
+
+    # Crawlers, unfurlers and health checks never count: they skip the rate
+    # limiter and the write path and get the cached count when there is one
+    if is_bot(user_agent):
+        BOT_HITS.inc()
+        logs.debug("bot", user_agent=user_agent)
+        if unique:
+            return await db.get_unique_views(repository)
+        count = db.cached_views(repository)
+        return count if count is not None else await db.get_views(repository)
+
+    start = perf_counter()
+    can_increment = await db.can_increment_view(
+        username=username,
+        ip=client_ip,
+        referrer=referrer,
+        user_agent=user_agent,
+        rate_limit_minutes=15/60,
+        repository=repository
+    )
+    RATE_LIMIT_SECONDS.observe(perf_counter() - start)
+
+    start = perf_counter()
+    if can_increment:
+        count = await db.increment_views(repository)
+        INCREMENT_VIEWS_SECONDS.observe(perf_counter() - start)
+        if not unique:
+            return count
+        start = perf_counter()
+    if unique:
+        count = await db.get_unique_views(repository)
+    else:
+        count = await db.get_views(repository)
+    GET_VIEWS_SECONDS.observe(perf_counter() - start)
+    return count
+
+async def sparkline_history(db: CounterDB, username: str, repo: str, style: str, days: int) -> tuple:
+    if style != "sparkline":
+        return ()
+    return await db.get_history(f"{username}/{repo}", min(max(days, 2), HISTORY_DAYS))
+
+async def svg_badge(
+    db: CounterDB,
+    username: str,
+    repo: str,
+    client_ip: str,
+    headers: Mapping[str, str],
+    style: str = "flat",
+    theme: str = "default",
+    label: str = "Views",
+    size: str = "normal",
+    font: str = "default",
+    animation: str = "none",
+    reverse: bool = False,
+    compact: bool = True,
+    metric: str = "views",
+    days: int = 14,
+    encodings: Optional[tuple] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    # `headers` are the request headers with lowercase names. `encodings`
+    # limits the content encodings offered (default: all supported).
+    request_start = perf_counter()
+    request_id = logs.start_request(headers.get("x-request-id"))
+    count = await count_view(
+        db, username, repo, client_ip, headers.get("user-agent", ""), headers.get("referer", ""), metric
+    )
+    key = badge_key(
+        count=count,
+        style=style,
+        theme=theme,
+        label=label,
+        size=size,
+        font=font,
+        animation=animation,
+        reverse=reverse,
+        compact=compact,
+        history=await sparkline_history(db, username, repo, style, days)
+    )
+    encoding = choose_encoding(headers.get("accept-encoding"), encodings)
+    etag = badge_etag(key, encoding)
+    response_headers = {**NO_CACHE_HEADERS, "ETag": etag, "Vary": "Accept-Encoding", "X-Request-ID": request_id}
+
+    # Unchanged badge: skip rendering and send no body
+    if etag_matches(headers.get("if-none-match"), etag):
+        REQUEST_SECONDS.observe(perf_counter() - request_start)
+        return 304, response_headers, b""
+
+    response_headers["Content-Type"] = "image/svg+xml"
+    if encoding != "identity":
+        response_headers["Content-Encoding"] = encoding
+    start = perf_counter()
+    body = badge_bytes(key, encoding)
+    end = perf_counter()
+    RENDER_SECONDS.observe(end - start)
+    REQUEST_SECONDS.observe(end - request_start)
+    logs.debug("render", seconds=round(end - start, 6), total_seconds=round(end - request_start, 6), bytes=len(body))
+    return 200, response_headers, body
+
+async def png_badge(
+    db: CounterDB,
+    username: str,
+    repo: str,
+    client_ip: str,
+    headers: Mapping[str, str],
+    style: str = "flat",
+    theme: str = "default",
+    label: str = "Views",
+    size: str = "normal",
+    font: str = "default",
+    reverse: bool = False,
+    metric: str = "views",
+    days: int = 14
+) -> Tuple[int, Dict[str, str], bytes]:
+    # Pillow is only loaded once a PNG is requested
+    from raster import badge_png, png_digest
+
+    request_start = perf_counter()
+    request_id = logs.start_request(headers.get("x-request-id"))
+    count = await count_view(
+        db, username, repo, client_ip, headers.get("user-agent", ""), headers.get("referer", ""), metric
+    )
+    key = badge_key(
+        count=count,
+        style=style,
+        theme=theme,
+        label=label,
+        size=size,
+        font=font,
+        reverse=reverse,
+        history=await sparkline_history(db, username, repo, style, days)
+    )
+    etag = f'"{png_digest(key)}-png"'
+    response_headers = {**NO_CACHE_HEADERS, "ETag": etag, "X-Request-ID": request_id}
+
+    if etag_matches(headers.get("if-none-match"), etag):
+        REQUEST_SECONDS.observe(perf_counter() - request_start)
+        return 304, response_headers, b""
+
+    response_headers["Content-Type"] = "image/png"
+    start = perf_counter()
+    body = badge_png(key)
+    end = perf_counter()
+    RENDER_SECONDS.observe(end - start)
+    REQUEST_SECONDS.observe(end - request_start)
+    logs.debug("render", seconds=round(end - start, 6), total_seconds=round(end - request_start, 6), bytes=len(body))
+    return 200, response_headers, body
+
+def choose_encoding(accept_encoding: Optional[str], encodings: Optional[tuple] = None) -> str:
+    if not accept_encoding:
+        return "identity"
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for encoding in supported_encodings() if encodings is None else encodings:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return "identity"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,46 @@
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ShardRouter:
+    # Tracks each repository's view rate in fixed windows. Once a window's
+    # rate reaches `hot_rate` views/s the repository is promoted, and its
+    # increments are spread across `shards` counter documents instead of
+    # contending on one.
+    def __init__(self, shards: int = 1, hot_rate: float = 20, window: float = 10, max_entries: int = 10000):
+        self.shards = max(1, min(shards, 64))
+        self.hot_rate = hot_rate
+        self.window = window
+        self.max_entries = max_entries
+        self.rates: "OrderedDict[str, list]" = OrderedDict()
+        self.hot: "OrderedDict[str, None]" = OrderedDict()
+
+    def record(self, repo: str, views: int, now: Optional[float] = None):
+        if self.shards == 1:
+            return
+        if now is None:
+            now = time.monotonic()
+
+        rate = self.rates.get(repo)
+        if rate is None or now - rate[0] >= self.window:
+            rate = [now, 0]
+        rate[1] += views
+        self.rates[repo] = rate
+        self.rates.move_to_end(repo)
+        if len(self.rates) > self.max_entries:
+            self.rates.popitem(last=False)
+
+        if rate[1] >= self.hot_rate * self.window and repo not in self.hot:
+            self.hot[repo] = None
+            if len(self.hot) > self.max_entries:
+                self.hot.popitem(last=False)
+
+    def shard_for(self, repo: str) -> int:
+        if repo in self.hot:
+            return random.randrange(self.shards)
+        return 0
+
+    def __len__(self) -> int:
+        return len(self.hot)
@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from history import History
+from hll import HyperLogLog
+
+
+class StorageBackend:
+    # Blocking storage primitives. CounterDB runs them on its thread pool,
+    # so implementations can use synchronous clients freely.
+    def fetch_count(self, repo: str) -> int:
+        raise NotImplementedError
+
+    def fetch_counts(self, repos: List[str]) -> Dict[str, int]:
+        # Counts of several repositories in as few round-trips as the
+        # backend allows; repositories without views map to 0
+        return {repo: self.fetch_count(repo) for repo in repos}
+
+    def add_count(self, repo: str, delta: int, shard: int = 0) -> int:
+        # Returns the new count of the shard that was written. Without
+        # sharding that is the repository's total.
+        raise NotImplementedError
+
+    def record_visit(self, visitor_id: str, username: str, ip: str, user_agent: str, referrer: str, last_visit: str):
+        raise NotImplementedError
+
+    def list_expired_visits(self, before: str, limit: int) -> List[str]:
+        # Ids of up to `limit` visitor records last seen before `before`
+        # (an ISO timestamp)
+        raise NotImplementedError
+
+    def delete_visit(self, visit_id: str, before: str):
+        # Deletes one record listed by list_expired_visits, unless it is
+        # gone already
+        raise NotImplementedError
+
+    def fetch_sketch(self, repo: str) -> Optional[bytes]:
+        # The repository's unique-visitor HyperLogLog registers, if any
+        raise NotImplementedError
+
+    def merge_sketch(self, repo: str, registers: bytes) -> bytes:
+        # Merges `registers` into the stored sketch and returns the result
+        raise NotImplementedError
+
+    def fetch_history(self, repo: str) -> Optional[bytes]:
+        # The repository's serialized History, if any
+        raise NotImplementedError
+
+    def add_history(self, repo: str, deltas: Dict[int, int]):
+        # Adds views per hour (hours since the epoch) to the stored History
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend(StorageBackend):
+    # Embedded single-node storage. WAL mode lets readers run alongside the
+    # writer, and increments are single atomic upserts.
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS views (
+            repository TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            last_updated TEXT NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS visitors (
+            visitor_id TEXT PRIMARY KEY,
+            ip TEXT,
+            username TEXT,
+            user_agent TEXT,
+            referrer TEXT,
+            last_visit TEXT NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS visitors_last_visit ON visitors (last_visit)',
+        '''CREATE TABLE IF NOT EXISTS sketches (
+            repository TEXT PRIMARY KEY,
+            registers BLOB NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS history (
+            repository TEXT PRIMARY KEY,
+            buckets BLOB NOT NULL
+        )'''
+    ]
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('SQLITE_PATH', 'views.db')
+        # sqlite3 connections can't be shared across threads, so each pool
+        # thread opens its own
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def fetch_count(self, repo: str) -> int:
+        row = self._connection().execute(
+            'SELECT count FROM views WHERE repository = ?', (repo,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def fetch_counts(self, repos: List[str]) -> Dict[str, int]:
+        counts = dict.fromkeys(repos, 0)
+        unique = list(counts)
+        # SQLite's default limit on bound parameters is 999
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            rows = self._connection().execute(
+                f"SELECT repository, count FROM views WHERE repository IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            counts.update(rows)
+        return counts
+
+    def add_count(self, repo: str, delta: int, shard: int = 0) -> int:
+        # Writes are serialized by SQLite itself, so shards would only add
+        # rows; every shard maps to the single row
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                '''INSERT INTO views (repository, count, last_updated) VALUES (?, ?, ?)
+                ON CONFLICT (repository) DO UPDATE SET
+                    count = count + excluded.count,
+                    last_updated = excluded.last_updated''',
+                (repo, delta, datetime.now().isoformat())
+            )
+            count = conn.execute('SELECT count FROM views WHERE repository = ?', (repo,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def record_visit(self, visitor_id: str, username: str, ip: str, user_agent: str, referrer: str, last_visit: str):
+        self._connection().execute(
+            '''INSERT INTO visitors (visitor_id, ip, username, user_agent, referrer, last_visit)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (visitor_id) DO UPDATE SET
+                last_visit = excluded.last_visit,
+                referrer = excluded.referrer''',
+            (visitor_id, ip, username, user_agent, referrer, last_visit)
+        )
+
+    def list_expired_visits(self, before: str, limit: int) -> List[str]:
+        rows = self._connection().execute(
+            'SELECT visitor_id FROM visitors WHERE last_visit < ? LIMIT ?',
+            (before, limit)
+        )
+        return [row[0] for row in rows]
+
+    def delete_visit(self, visit_id: str, before: str):
+        # A visitor seen again since it was listed keeps its record
+        self._connection().execute(
+            'DELETE FROM visitors WHERE visitor_id = ? AND last_visit < ?',
+            (visit_id, before)
+        )
+
+    def fetch_sketch(self, repo: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            'SELECT registers FROM sketches WHERE repository = ?', (repo,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def merge_sketch(self, repo: str, registers: bytes) -> bytes:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT registers FROM sketches WHERE repository = ?', (repo,)).fetchone()
+            sketch = HyperLogLog(registers)
+            if row is not None:
+                sketch.merge(row[0])
+            conn.execute(
+                'INSERT OR REPLACE INTO sketches (repository, registers) VALUES (?, ?)',
+                (repo, bytes(sketch))
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return bytes(sketch)
+
+    def fetch_history(self, repo: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            'SELECT buckets FROM history WHERE repository = ?', (repo,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_history(self, repo: str, deltas: Dict[int, int]):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT buckets FROM history WHERE repository = ?', (repo,)).fetchone()
+            history = History(row[0] if row else None)
+            history.merge(deltas)
+            conn.execute(
+                'INSERT OR REPLACE INTO history (repository, buckets) VALUES (?, ?)',
+                (repo, bytes(history))
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+def _appwrite_backend() -> StorageBackend:
+    # The Appwrite SDK takes most of a second to import, so it is only
+    # loaded when it is the configured backend
+    from appwrite_backend import AppwriteBackend
+    return AppwriteBackend()
+
+BACKENDS = {
+    'appwrite': _appwrite_backend,
+    'sqlite': SQLiteBackend
+}
+
+def create_backend(name: str = None) -> StorageBackend:
+    name = (name or os.getenv('STORAGE_BACKEND', 'appwrite')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()